@@ -0,0 +1,40 @@
+import os
+import threading
+
+
+class ProcessThread:
+    """A daemon thread that runs `target` once per process.
+
+    `start` is cheap enough to call on every request. Threads don't survive
+    a fork, so the first call in a forked child starts the child's own; no
+    thread is started until something calls it, which keeps them out of a
+    preloading gunicorn master and CLI commands. `setup`, if given, runs
+    just before each new thread starts.
+    """
+
+    def __init__(self, target, name, setup=None):
+        self.name = name
+        self.thread = None
+        self._target = target
+        self._setup = setup
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the thread unless this process already has; return True if it started now."""
+        if self._pid == os.getpid():
+            return False
+        with self._lock:
+            if self._pid == os.getpid():
+                return False
+            self._pid = os.getpid()
+            if self._setup:
+                self._setup()
+            self.thread = threading.Thread(target=self._target, name=self.name, daemon=True)
+            self.thread.start()
+            return True
+
+    def join(self):
+        thread, self.thread = self.thread, None
+        if thread is not None:
+            thread.join()
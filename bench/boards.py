@@ -0,0 +1,91 @@
+"""Check that per-request cost stays flat as the number of boards grows.
+
+Usage: python bench/boards.py [boards ...]   (default: 10 1000 50000)
+
+Seeds a fresh SQLite database per size with NAMES people on every board,
+then times board-scoped requests on randomly chosen boards: snapshot reads
+and board pages with the worker's caches empty and warm, rank lookups and
+updates. Exits non-zero if a request fails or gets more than SLOWDOWN
+times slower between the smallest and the largest size.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ["CHANGE_NOTIFY"] = "0"
+
+import app as module  # noqa: E402
+from models import db, Score, create_schema  # noqa: E402
+
+NAMES = 10
+SLOWDOWN = 3.0
+
+
+def timed(client, requests, cold=False):
+    elapsed = 0.0
+    for method, path, body in requests:
+        if cold:
+            # Fresh caches, as after an eviction or a worker restart
+            module.leaderboards = module.Leaderboards(module.leaderboards.ttl,
+                                                      module.leaderboards.max_boards)
+        start = time.perf_counter()
+        resp = client.open(path, method=method, json=body)
+        elapsed += time.perf_counter() - start
+        if resp.status_code >= 400:
+            sys.exit(f"{method} {path}: {resp.status_code}")
+    return elapsed / len(requests) * 1000
+
+
+def bench(boards, tmp):
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, f'boards-{boards}.db')}"
+    app = module.create_app()
+    with app.app_context():
+        create_schema()
+        rng = random.Random(boards)
+        rows = [{"board_id": f"b{b}", "name": f"user{n}", "score": rng.randint(0, 1000)}
+                for b in range(boards) for n in range(NAMES)]
+        for start in range(0, len(rows), 50000):
+            db.session.execute(db.insert(Score), rows[start:start + 50000])
+        db.session.commit()
+
+    client = app.test_client()
+    sample = [f"b{rng.randrange(boards)}" for _ in range(200)]
+    reads = [("GET", f"/api/boards/{b}/scores", None) for b in sample]
+    pages = [("GET", f"/boards/{b}", None) for b in sample]
+    results = {
+        "cold read": timed(client, reads, cold=True),
+        "cold page": timed(client, pages, cold=True),
+    }
+    # Every sampled board is cached after this pass
+    timed(client, pages)
+    results.update({
+        "warm read": timed(client, reads),
+        "warm page": timed(client, pages),
+        "rank": timed(client, [("GET", f"/api/boards/{b}/rank/user{rng.randrange(NAMES)}", None)
+                               for b in sample]),
+        "update": timed(client, [("POST", f"/api/boards/{b}/update",
+                                  {"person": f"user{rng.randrange(NAMES)}", "change": 1})
+                                 for b in sample]),
+    })
+    print(f"{boards:>7} boards: " + ", ".join(f"{k} {v:6.2f} ms" for k, v in results.items()))
+    return results
+
+
+def main(sizes):
+    with tempfile.TemporaryDirectory() as tmp:
+        results = [bench(boards, tmp) for boards in sizes]
+    failed = False
+    for name in results[0]:
+        ratio = results[-1][name] / results[0][name]
+        if ratio > SLOWDOWN:
+            print(f"FAIL {name}: {ratio:.1f}x slower at {sizes[-1]} boards than at {sizes[0]}")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main([int(a) for a in sys.argv[1:]] or [10, 1000, 50000]))
@@ -0,0 +1,55 @@
+"""Measure worker cold start: importing app.py and serving the first request.
+
+Usage: python bench/cold_start.py [runs]
+
+Each run is a fresh interpreter against an existing SQLite database, like
+a newly forked gunicorn worker without preload. Reports median timings and
+how many database connections were opened before the first request.
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import time
+start = time.perf_counter()
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+connects = []
+event.listen(Pool, "connect", lambda *args: connects.append(1))
+import app as module
+app = module.app
+booted = time.perf_counter()
+at_boot = len(connects)
+app.test_client().get("/api/scores")
+served = time.perf_counter()
+print(booted - start, served - booted, at_boot)
+"""
+
+
+def main(runs=10):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                   PYTHONPATH=ROOT)
+
+        def run():
+            out = subprocess.run([sys.executable, "-c", CHILD], env=env, cwd=ROOT,
+                                 capture_output=True, text=True, check=True).stdout
+            return [float(v) for v in out.split()]
+
+        run()  # create the database and warm the OS file cache
+        samples = [run() for _ in range(runs)]
+
+    boot = statistics.median(s[0] for s in samples) * 1000
+    first = statistics.median(s[1] for s in samples) * 1000
+    connects = max(int(s[2]) for s in samples)
+    print(f"boot {boot:.1f} ms, first request {first:.1f} ms, "
+          f"connections opened during boot: {connects}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
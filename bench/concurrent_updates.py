@@ -0,0 +1,58 @@
+"""Fire many parallel /api/update calls and check no increment is lost.
+
+Usage: python bench/concurrent_updates.py [requests] [threads]
+
+Runs against a throwaway SQLite database unless DATABASE_URL is set.
+Exits non-zero if any request fails or an increment is lost.
+"""
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if "DATABASE_URL" not in os.environ:
+    _tmpdir = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+
+from app import app  # noqa: E402
+from models import db, Score, create_schema  # noqa: E402
+
+NAME = "bench-concurrency"
+
+
+def main(total=2000, threads=32):
+    with app.app_context():
+        create_schema()
+        Score.query.filter_by(name=NAME).delete()
+        db.session.commit()
+
+    client = app.test_client()
+
+    def hit(_):
+        resp = client.post("/api/update", json={"person": NAME, "change": 1})
+        return resp.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        statuses = list(pool.map(hit, range(total)))
+    elapsed = time.perf_counter() - start
+
+    failed = sum(1 for s in statuses if s != 200)
+    with app.app_context():
+        final = Score.query.filter_by(name=NAME).one().score
+
+    print(f"{total} increments, {threads} threads: {elapsed:.2f}s "
+          f"({total / elapsed:.0f} req/s), {failed} failed, final={final}")
+    if failed:
+        print(f"FAILED: {failed} requests got {sorted(set(s for s in statuses if s != 200))}")
+    if final != total - failed:
+        print(f"LOST UPDATES: expected {total - failed}, got {final}")
+    return 1 if failed or final != total - failed else 0
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    sys.exit(main(*args))
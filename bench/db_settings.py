@@ -0,0 +1,130 @@
+"""Measure how SQLite pragmas and pool sizing affect read/write throughput.
+
+Usage: python bench/db_settings.py [seconds]
+
+Each SQLite configuration runs reader and writer processes against a fresh
+database, the way separate gunicorn workers would. The pool section runs
+threads in one process against a single engine to show checkout waits.
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import create_engine, text  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from models import configure_engine, engine_options  # noqa: E402
+
+READERS, WRITERS, ROWS = 4, 2, 1000
+
+SQLITE_CONFIGS = [
+    ("rollback journal, synchronous=FULL", {"SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_SYNCHRONOUS": "FULL"}),
+    ("WAL, synchronous=FULL", {"SQLITE_JOURNAL_MODE": "WAL", "SQLITE_SYNCHRONOUS": "FULL"}),
+    ("WAL, synchronous=NORMAL (default)", {}),
+    ("WAL, NORMAL, busy_timeout=0", {"SQLITE_BUSY_TIMEOUT_MS": "0"}),
+]
+
+
+def make_engine(url, env):
+    engine = create_engine(url, **engine_options(url, env))
+    configure_engine(engine, env)
+    return engine
+
+
+def setup(url, env):
+    # Create the database in the journal mode under test; switching out of
+    # WAL later needs exclusive access
+    engine = make_engine(url, env)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE score (id INTEGER PRIMARY KEY, name TEXT UNIQUE, score INTEGER)"))
+        conn.execute(text("INSERT INTO score (name, score) VALUES (:name, 0)"),
+                     [{"name": f"user{i}"} for i in range(ROWS)])
+    engine.dispose()
+
+
+def worker(url, env, role, seconds, results):
+    engine = make_engine(url, env)
+    done = errors = 0
+    deadline = time.monotonic() + seconds
+    i = 0
+    while time.monotonic() < deadline:
+        i += 1
+        try:
+            if role == "read":
+                with engine.connect() as conn:
+                    conn.execute(text("SELECT name, score FROM score ORDER BY score DESC")).all()
+            else:
+                with engine.begin() as conn:
+                    conn.execute(text("UPDATE score SET score = score + 1 WHERE name = :name"),
+                                 {"name": f"user{i % ROWS}"})
+            done += 1
+        except OperationalError:
+            errors += 1
+    results.put((role, done, errors))
+    engine.dispose()
+
+
+def bench_sqlite(seconds):
+    print(f"SQLite, {READERS} reader and {WRITERS} writer processes, {seconds}s each")
+    for label, env in SQLITE_CONFIGS:
+        with tempfile.TemporaryDirectory() as tmp:
+            url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+            setup(url, env)
+            results = multiprocessing.Queue()
+            procs = [multiprocessing.Process(target=worker, args=(url, env, role, seconds, results))
+                     for role in ["read"] * READERS + ["write"] * WRITERS]
+            for p in procs:
+                p.start()
+            totals = {"read": [0, 0], "write": [0, 0]}
+            for _ in procs:
+                role, done, errors = results.get()
+                totals[role][0] += done
+                totals[role][1] += errors
+            for p in procs:
+                p.join()
+        (reads, read_errors), (writes, write_errors) = totals["read"], totals["write"]
+        print(f"  {label:<36} reads {reads / seconds:8.0f}/s ({read_errors} locked), "
+              f"writes {writes / seconds:7.0f}/s ({write_errors} locked)")
+
+
+def bench_pool(seconds, threads=32):
+    print(f"Pool checkout, {threads} threads sharing one engine, {seconds}s each")
+    for pool_size, overflow in [(2, 0), (5, 10), (20, 20)]:
+        with tempfile.TemporaryDirectory() as tmp:
+            url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+            env = {"DB_POOL_SIZE": str(pool_size), "DB_MAX_OVERFLOW": str(overflow)}
+            setup(url, env)
+            engine = make_engine(url, env)
+            waits, lock = [], threading.Lock()
+            deadline = time.monotonic() + seconds
+
+            def run():
+                while time.monotonic() < deadline:
+                    start = time.perf_counter()
+                    with engine.connect() as conn:
+                        waited = time.perf_counter() - start
+                        conn.execute(text("SELECT name, score FROM score ORDER BY score DESC")).all()
+                    with lock:
+                        waits.append(waited)
+
+            pool = [threading.Thread(target=run) for _ in range(threads)]
+            for t in pool:
+                t.start()
+            for t in pool:
+                t.join()
+            engine.dispose()
+        waits.sort()
+        print(f"  pool_size={pool_size:<3} max_overflow={overflow:<3} "
+              f"reads {len(waits) / seconds:7.0f}/s, checkout p50 {waits[len(waits) // 2] * 1000:6.2f} ms, "
+              f"p99 {waits[int(len(waits) * 0.99)] * 1000:6.2f} ms")
+
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+    bench_sqlite(seconds)
+    bench_pool(seconds)
@@ -0,0 +1,72 @@
+"""Hammer one name from many clients, single row vs. sharded counters.
+
+Usage: python bench/hot_row.py [requests] [threads] [shards]
+
+Each mode runs in its own process. Without DATABASE_URL both use a fresh
+SQLite database, where every write takes the same database lock anyway;
+point DATABASE_URL at a scratch Postgres database to see the row-lock
+contention that sharding relieves. Exits non-zero if an update is lost.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NAME = "bench-hot-row"
+
+
+def run(total, threads):
+    sys.path.insert(0, ROOT)
+    from app import app, shard_compactor
+    from models import db, Score, ScoreShard, compact_shards, create_schema
+
+    with app.app_context():
+        create_schema()
+        Score.query.filter_by(name=NAME).delete()
+        ScoreShard.query.filter_by(name=NAME).delete()
+        db.session.commit()
+
+    client = app.test_client()
+
+    def hit(_):
+        return client.post("/api/update", json={"person": NAME, "change": 1}).status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        statuses = list(pool.map(hit, range(total)))
+    elapsed = time.perf_counter() - start
+
+    if shard_compactor:
+        shard_compactor.stop()
+    with app.app_context():
+        compact_shards()
+        db.session.commit()
+        final = Score.query.filter_by(name=NAME).one().score
+
+    failed = sum(1 for s in statuses if s != 200)
+    shards = app.config["SCORE_SHARDS"]
+    mode = f"{shards} shards" if shards > 1 else "single row"
+    print(f"{mode:>11}: {total / elapsed:8.0f} req/s, {failed} failed, final={final}")
+    return 0 if final == total - failed else 1
+
+
+def main(total=2000, threads=32, shards=16):
+    status = 0
+    for mode in ("1", str(shards)):
+        env = dict(os.environ, SCORE_SHARDS=mode)
+        with tempfile.TemporaryDirectory() as tmp:
+            env.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+            result = subprocess.run([sys.executable, __file__, "--child", str(total), str(threads)],
+                                    env=env)
+        status = status or result.returncode
+    return status
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        sys.exit(run(int(sys.argv[2]), int(sys.argv[3])))
+    else:
+        sys.exit(main(*[int(a) for a in sys.argv[1:4]]))
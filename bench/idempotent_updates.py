@@ -0,0 +1,71 @@
+"""Send every update several times at once and check each is counted once.
+
+Usage: python bench/idempotent_updates.py [keys] [copies] [threads]
+
+Each of `keys` idempotency keys is posted `copies` times, shuffled across
+`threads` threads, as a client retrying after lost responses would. Runs
+the synchronous and write-behind paths in their own processes against
+fresh SQLite databases. Exits non-zero if any update is applied twice.
+"""
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NAME = "bench-idempotent"
+
+
+def run(keys, copies, threads):
+    sys.path.insert(0, ROOT)
+    from app import app, write_behind
+    from models import Score
+
+    client = app.test_client()
+    requests = [f"key-{i}" for i in range(keys)] * copies
+    random.shuffle(requests)
+
+    def hit(key):
+        resp = client.post("/api/update", json={"person": NAME, "change": 1},
+                           headers={"Idempotency-Key": key})
+        return resp.status_code, resp.headers.get("Idempotent-Replayed") == "true"
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(hit, requests))
+    elapsed = time.perf_counter() - start
+
+    if write_behind:
+        write_behind.stop()
+    with app.app_context():
+        final = Score.query.filter_by(name=NAME).one().score
+
+    failed = sum(1 for status, _ in results if status != 200)
+    replayed = sum(1 for _, r in results if r)
+    mode = "write-behind" if write_behind else "synchronous"
+    print(f"{mode:>13}: {len(requests) / elapsed:6.0f} req/s, {failed} failed, "
+          f"{replayed} replayed, final={final} (expected {keys})")
+    return 0 if final == keys and not failed else 1
+
+
+def main(keys=500, copies=3, threads=16):
+    status = 0
+    for write_behind in ("0", "1"):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ,
+                       DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                       WRITE_BEHIND=write_behind)
+            result = subprocess.run(
+                [sys.executable, __file__, "--child", str(keys), str(copies), str(threads)], env=env)
+        status = status or result.returncode
+    return status
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        sys.exit(run(*[int(a) for a in sys.argv[2:5]]))
+    else:
+        sys.exit(main(*[int(a) for a in sys.argv[1:4]]))
@@ -0,0 +1,55 @@
+"""Time top-N pages and rank lookups against seeded leaderboards.
+
+Usage: python bench/leaderboard_queries.py [rows ...]   (default: 1000 100000 1000000)
+
+Seeds a fresh SQLite database per size and compares the indexed queries
+with loading the full board the way the unpaginated /api/scores does.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+from models import db, Score, create_schema, rank, top_scores  # noqa: E402
+
+
+def timed(fn, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def bench(rows):
+    with tempfile.TemporaryDirectory() as tmp:
+        app = Flask(__name__)
+        app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        db.init_app(app)
+        with app.app_context():
+            create_schema()
+            rng = random.Random(rows)
+            for start in range(0, rows, 50000):
+                db.session.execute(db.insert(Score), [
+                    {"name": f"user{i}", "score": rng.randint(0, rows)}
+                    for i in range(start, min(start + 50000, rows))
+                ])
+            db.session.commit()
+
+            probe = [f"user{rng.randrange(rows)}" for _ in range(20)]
+            results = {
+                "top 50": timed(lambda: top_scores(50)),
+                "page @ middle": timed(lambda: top_scores(50, rows // 2)),
+                "rank": timed(lambda: rank(rng.choice(probe))),
+                "full board": timed(lambda: Score.query.order_by(Score.score.desc()).all(),
+                                    repeat=1 if rows > 100000 else 5),
+            }
+        print(f"{rows:>9} rows: " + ", ".join(f"{k} {v:8.2f} ms" for k, v in results.items()))
+
+
+if __name__ == "__main__":
+    for rows in [int(a) for a in sys.argv[1:]] or [1000, 100000, 1000000]:
+        bench(rows)
@@ -0,0 +1,238 @@
+"""Replay a mix of score polls and update bursts and report latency.
+
+Usage:
+    python bench/loadtest.py --target app --concurrency 32 --duration 20 -o results.json
+    python bench/loadtest.py --target http://localhost:8000 --trace traffic.jsonl
+    python bench/loadtest.py --compare before.json after.json
+
+Targets `app` (gunicorn on a throwaway SQLite database), `score`
+(score.py's HTTPServer) and `respect_score` (respect_score.py under
+gunicorn) are started in a temporary directory and stopped afterwards;
+any other target is treated as the base URL of a running server.
+
+A trace is JSON lines of {"method": ..., "path": ..., "body": ...}; it is
+replayed in order, round-robin across workers. Without a trace, each
+worker polls /api/scores and, with probability --update-ratio, sends a
+burst of --burst /api/update calls instead.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NAMES = ["ali", "hamza", "yasir"]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(target, workdir, workers):
+    """Start a local server for `target`; return (process, base_url)."""
+    port = free_port()
+    # Worker class and threads come from gunicorn.conf.py and its environment
+    env = dict(os.environ, PYTHONPATH=ROOT, WEB_CONCURRENCY=str(workers))
+    gunicorn = [sys.executable, "-m", "gunicorn", "--config", os.path.join(ROOT, "gunicorn.conf.py"),
+                "--bind", f"127.0.0.1:{port}", "--log-level", "warning"]
+    if target == "app":
+        env["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+        cmd = gunicorn + ["app:app"]
+    elif target == "respect_score":
+        # Its ScoreStore allows a single writing process
+        env["WEB_CONCURRENCY"] = "1"
+        cmd = gunicorn + ["respect_score:app"]
+    elif target == "score":
+        shutil.copy(os.path.join(ROOT, "templates", "index.html"), workdir)
+        cmd = [sys.executable, os.path.join(ROOT, "score.py"), str(port)]
+    else:
+        raise ValueError(f"Unknown target {target!r}")
+
+    proc = subprocess.Popen(cmd, cwd=workdir, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return proc, f"http://127.0.0.1:{port}"
+        except OSError:
+            if proc.poll() is not None:
+                raise RuntimeError(f"{target} exited with status {proc.returncode}")
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"{target} did not start listening on port {port}")
+
+
+def synthetic(rng, update_ratio, burst):
+    """Yield (method, path, body) requests: mostly polls, sometimes a burst."""
+    while True:
+        if rng.random() < update_ratio:
+            for _ in range(burst):
+                yield "POST", "/api/update", {"person": rng.choice(NAMES), "change": rng.choice((1, -1))}
+        else:
+            yield "GET", "/api/scores", None
+
+
+def replay(trace):
+    with open(trace, encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    while True:
+        for entry in entries:
+            yield entry.get("method", "GET"), entry["path"], entry.get("body")
+
+
+def worker(base_url, requests, deadline, remaining, lock, samples, errors):
+    url = urlparse(base_url)
+    conn = http.client.HTTPConnection(url.hostname, url.port, timeout=30)
+    while time.monotonic() < deadline:
+        with lock:
+            if remaining[0] == 0:
+                break
+            remaining[0] -= 1
+            method, path, body = next(requests)
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        payload = json.dumps(body).encode() if body is not None else None
+        start = time.perf_counter()
+        try:
+            conn.request(method, path, body=payload, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            ok = response.status < 400
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection(url.hostname, url.port, timeout=30)
+            ok = False
+        elapsed = time.perf_counter() - start
+        with lock:
+            samples.setdefault(f"{method} {path}", []).append(elapsed)
+            if not ok:
+                errors[0] += 1
+    conn.close()
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, round(pct / 100 * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+def summarize(values, elapsed):
+    values = sorted(values)
+    return {
+        "requests": len(values),
+        "throughput": len(values) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+    }
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    requests = replay(args.trace) if args.trace else synthetic(rng, args.update_ratio, args.burst)
+    samples, errors, lock = {}, [0], threading.Lock()
+    remaining = [args.requests or -1]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        proc = None
+        base_url = args.target
+        if not args.target.startswith("http"):
+            proc, base_url = start_server(args.target, workdir, args.workers)
+        try:
+            start = time.perf_counter()
+            deadline = time.monotonic() + args.duration
+            threads = [threading.Thread(target=worker, args=(base_url, requests, deadline,
+                                                             remaining, lock, samples, errors))
+                       for _ in range(args.concurrency)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - start
+        finally:
+            if proc is not None:
+                proc.terminate()
+                proc.wait(timeout=30)
+
+    overall = summarize([v for vs in samples.values() for v in vs], elapsed)
+    return {
+        "label": args.label or args.target,
+        "target": args.target,
+        "concurrency": args.concurrency,
+        "trace": args.trace,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "elapsed_s": elapsed,
+        "errors": errors[0],
+        "overall": overall,
+        "routes": {route: summarize(vs, elapsed) for route, vs in sorted(samples.items())},
+    }
+
+
+def print_result(result):
+    o = result["overall"]
+    print(f"{result['label']}: {o['requests']} requests in {result['elapsed_s']:.1f}s, "
+          f"{o['throughput']:.0f} req/s, {result['errors']} errors")
+    for route, r in [("overall", o)] + list(result["routes"].items()):
+        print(f"  {route:<24} {r['requests']:>8} {r['throughput']:>8.0f}/s  "
+              f"p50 {r['p50_ms']:7.2f}  p95 {r['p95_ms']:7.2f}  p99 {r['p99_ms']:7.2f} ms")
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"{before['label']} -> {after['label']}")
+    for route in ["overall"] + sorted(set(before["routes"]) & set(after["routes"])):
+        b = before["overall"] if route == "overall" else before["routes"][route]
+        a = after["overall"] if route == "overall" else after["routes"][route]
+        cells = []
+        for key in ("throughput", "p50_ms", "p95_ms", "p99_ms"):
+            change = (a[key] - b[key]) / b[key] * 100 if b[key] else 0.0
+            cells.append(f"{key} {b[key]:.1f} -> {a[key]:.1f} ({change:+.0f}%)")
+        print(f"  {route:<24} " + ", ".join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", default="app",
+                        help="app, score, respect_score, or the base URL of a running server")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--requests", type=int, default=0, help="stop after this many (0: no limit)")
+    parser.add_argument("--workers", type=int, default=2,
+                        help="gunicorn workers for local targets (GUNICORN_WORKER_CLASS picks the mode; "
+                             "respect_score always gets one)")
+    parser.add_argument("--trace", help="JSON-lines file of recorded requests to replay")
+    parser.add_argument("--update-ratio", type=float, default=0.1)
+    parser.add_argument("--burst", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--label")
+    parser.add_argument("-o", "--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    result = run(args)
+    print_result(result)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
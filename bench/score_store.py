@@ -0,0 +1,86 @@
+"""Benchmark ScoreStore writes and check that it survives a hard crash.
+
+Usage: python bench/score_store.py [updates]
+
+Compares rewriting scores.json on every change (the old behaviour of
+score.py and respect_score.py) with ScoreStore's journal, with and without
+fsync per change. The crash check SIGKILLs a writer mid-stream and verifies
+that every acknowledged change is recovered.
+"""
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from score_store import ScoreStore  # noqa: E402
+
+DEFAULTS = {"ali": 0, "hamza": 0, "yasir": 0}
+
+
+def rewrite_every_time(path, updates):
+    scores = dict(DEFAULTS)
+    for i in range(updates):
+        scores["ali"] += 1
+        with open(path, "w") as f:
+            json.dump(scores, f)
+
+
+def with_store(path, updates, sync):
+    store = ScoreStore(path, DEFAULTS, sync=sync)
+    for i in range(updates):
+        store.update("ali", 1)
+    store.close()
+
+
+def bench(updates):
+    for label, fn in [("rewrite file per change", rewrite_every_time),
+                      ("ScoreStore", lambda p, n: with_store(p, n, sync=False)),
+                      ("ScoreStore, sync=True", lambda p, n: with_store(p, n, sync=True))]:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "scores.json")
+            start = time.perf_counter()
+            fn(path, updates)
+            elapsed = time.perf_counter() - start
+            with open(path) as f:
+                assert json.load(f)["ali"] == updates
+        print(f"{label:>24}: {updates / elapsed:10.0f} writes/s")
+
+
+def crash_child(path):
+    store = ScoreStore(path, DEFAULTS, delay=0.01)
+    while True:
+        scores = store.update("ali", 1)
+        # Acknowledge only after update() returned, like an HTTP response would
+        print(scores["ali"], flush=True)
+
+
+def crash_check():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "scores.json")
+        proc = subprocess.Popen([sys.executable, __file__, "--crash-child", path],
+                                stdout=subprocess.PIPE, text=True)
+        time.sleep(1.0)
+        proc.send_signal(signal.SIGKILL)
+        acked = [int(line) for line in proc.stdout.read().split() if line.isdigit()]
+        proc.wait()
+
+        recovered = ScoreStore(path, DEFAULTS).snapshot()["ali"]
+        last_acked = acked[-1] if acked else 0
+        ok = last_acked <= recovered <= last_acked + 1
+        print(f"crash check: last acknowledged {last_acked}, recovered {recovered}: "
+              f"{'OK' if ok else 'LOST WRITES'}")
+        return ok
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--crash-child"]:
+        crash_child(sys.argv[2])
+    else:
+        bench(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
+        sys.exit(0 if crash_check() else 1)
@@ -0,0 +1,68 @@
+"""Compare the synchronous /api/update path against write-behind mode.
+
+Usage: python bench/write_behind.py [requests] [threads]
+
+Each mode runs in its own process against a fresh SQLite database and
+reports requests per second and how many commits hit the database.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NAMES = ["ali", "hamza", "yasir"]
+
+
+def run(total, threads):
+    sys.path.insert(0, ROOT)
+    from sqlalchemy import event
+    from app import app, write_behind
+    from models import db, Score
+
+    commits = 0
+
+    def count_commit(_conn):
+        nonlocal commits
+        commits += 1
+
+    with app.app_context():
+        event.listen(db.engine, "commit", count_commit)
+
+    client = app.test_client()
+
+    def hit(i):
+        client.post("/api/update", json={"person": NAMES[i % len(NAMES)], "change": 1})
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(hit, range(total)))
+    elapsed = time.perf_counter() - start
+
+    if write_behind:
+        write_behind.stop()
+    with app.app_context():
+        final = sum(s.score for s in Score.query.all())
+
+    mode = "write-behind" if write_behind else "synchronous"
+    print(f"{mode:>13}: {total / elapsed:8.0f} req/s, {commits:5d} commits "
+          f"({commits / elapsed:6.0f}/s), final total {final}")
+
+
+def main(total=2000, threads=16):
+    for write_behind in ("0", "1"):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ,
+                       DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                       WRITE_BEHIND=write_behind)
+            subprocess.run([sys.executable, __file__, "--child", str(total), str(threads)],
+                           env=env, check=True)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        run(int(sys.argv[2]), int(sys.argv[3]))
+    else:
+        main(*[int(a) for a in sys.argv[1:3]])
@@ -0,0 +1,113 @@
+import json
+import threading
+from collections import deque
+
+
+def format_event(event, data):
+    """Encode one Server-Sent Events frame."""
+    if not isinstance(data, str):
+        data = json.dumps(data)
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+class Broadcaster:
+    """Fan out score changes to Server-Sent Events subscribers.
+
+    Subscribers share one short backlog of sequence-numbered events and a
+    single Condition instead of owning a queue each, so an idle connection
+    costs one parked thread (or greenlet) and no per-event work until
+    something is published.
+    """
+
+    def __init__(self, backlog=256, heartbeat=15.0):
+        self.heartbeat = heartbeat
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=backlog)
+        self._seq = 0
+
+    @property
+    def seq(self):
+        with self._cond:
+            return self._seq
+
+    def publish(self, data, event="score"):
+        """Queue `data` (a JSON-serializable delta) for every subscriber."""
+        with self._cond:
+            self._seq += 1
+            self._events.append((self._seq, format_event(event, data)))
+            self._cond.notify_all()
+
+    def _wait(self, last_seq):
+        with self._cond:
+            if self._seq == last_seq:
+                self._cond.wait(self.heartbeat)
+            return self._seq, [frame for seq, frame in self._events if seq > last_seq]
+
+    def stream(self, snapshot, since):
+        """Yield SSE frames: `snapshot`, then every event after `since`.
+
+        Deltas carry absolute totals, so an event that is already reflected
+        in the snapshot is harmless to replay. A subscriber that falls
+        further behind than the backlog is told to resync instead.
+        """
+        yield "retry: 3000\n\n"
+        yield format_event("snapshot", snapshot)
+        seq = since
+        while True:
+            latest, frames = self._wait(seq)
+            if latest == seq:
+                yield ": ping\n\n"
+            elif latest - seq > len(frames):
+                yield format_event("resync", {})
+            else:
+                yield from frames
+            seq = latest
+
+
+class Broadcasters:
+    """One `Broadcaster` per board, kept only while the board has subscribers.
+
+    Publishing to a board nobody is watching is a dict lookup, so the number
+    of boards doesn't matter, only the number of open streams. At most
+    `max_streams` can be open at once across all boards (None for no limit).
+    """
+
+    def __init__(self, max_streams=None, **options):
+        self.max_streams = max_streams
+        self._options = options
+        self._lock = threading.Lock()
+        self._boards = {}
+        self._streams = 0
+
+    def subscribe(self, board):
+        """Return `board`'s broadcaster, or None if `max_streams` are already open.
+
+        Call `unsubscribe(board)` when the stream ends.
+        """
+        with self._lock:
+            if self.max_streams is not None and self._streams >= self.max_streams:
+                return None
+            self._streams += 1
+            entry = self._boards.get(board)
+            if entry is None:
+                entry = self._boards[board] = [Broadcaster(**self._options), 0]
+            entry[1] += 1
+            return entry[0]
+
+    def unsubscribe(self, board):
+        with self._lock:
+            self._streams -= 1
+            entry = self._boards[board]
+            entry[1] -= 1
+            if not entry[1]:
+                del self._boards[board]
+
+    def publish(self, board, data, event="score"):
+        """Publish to `board`'s subscribers, or to every board's if `board` is None."""
+        with self._lock:
+            if board is None:
+                targets = [broadcaster for broadcaster, _ in self._boards.values()]
+            else:
+                targets = [self._boards[board][0]] if board in self._boards else []
+        for broadcaster in targets:
+            broadcaster.publish(data, event)
@@ -0,0 +1,37 @@
+import atexit
+import logging
+import threading
+
+from background import ProcessThread
+
+log = logging.getLogger(__name__)
+
+
+class ShardCompactor:
+    """Call `compact` from a background thread every `interval` seconds.
+
+    Used in sharded-counter mode to fold `ScoreShard` rows back into their
+    `Score` rows, keeping the shard table small.
+    """
+
+    def __init__(self, compact, interval=1.0):
+        self.interval = interval
+        self._compact = compact
+        self._stop = threading.Event()
+        self._thread = ProcessThread(self._run, "shard-compactor", setup=self._stop.clear)
+
+    def start(self):
+        """Start this process's compactor thread; safe to call on every request."""
+        if self._thread.start():
+            atexit.register(self.stop)
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self._compact()
+            except Exception:
+                log.exception("Shard compaction failed; will retry")
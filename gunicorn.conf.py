@@ -0,0 +1,100 @@
+"""Gunicorn settings for app.py, driven by the environment.
+
+GUNICORN_WORKER_CLASS picks the mode:
+  gthread (default)  a few processes with many threads each; every idle poller
+                     or open /api/stream connection parks one thread, so
+                     streams are capped below the thread count.
+  gevent             one greenlet per connection, for thousands of mostly idle
+                     streams. Requires the gevent and psycogreen packages.
+  sync               one request per process; /api/stream is turned off and
+                     pages poll instead.
+
+WEB_CONCURRENCY, GUNICORN_THREADS, GUNICORN_WORKER_CONNECTIONS and
+SSE_MAX_STREAMS override the defaults. See README.md for a comparison of
+the modes.
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+cpus = multiprocessing.cpu_count()
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+
+if worker_class == "gevent":
+    # Patch before the app (and its locks) is imported by preload_app
+    from gevent import monkey
+
+    monkey.patch_all()
+
+    # psycopg2 is a C extension the monkey-patching can't reach; without this
+    # every Postgres query blocks the whole worker
+    from psycogreen.gevent import patch_psycopg
+
+    patch_psycopg()
+
+if worker_class == "sync":
+    default_workers = cpus * 2 + 1
+else:
+    # Concurrency comes from threads or greenlets, so one process per core
+    default_workers = cpus
+workers = int(os.environ.get("WEB_CONCURRENCY", default_workers))
+threads = int(os.environ.get("GUNICORN_THREADS", 100))
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", 2000))
+
+# Streams never finish, so leave threads free for ordinary requests; clients
+# turned away fall back to polling. Read by app.py when it is imported.
+if worker_class == "gthread":
+    os.environ.setdefault("SSE_MAX_STREAMS", str(threads * 3 // 4))
+elif worker_class == "sync":
+    os.environ.setdefault("SSE_MAX_STREAMS", "0")
+
+# Pollers reuse their connection every few seconds; keep it open between polls
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 15))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+
+# Recycle workers now and then to bound slow leaks; jitter keeps them from
+# all restarting at once
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 10000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 1000))
+
+# Import the app once in the master so workers share its memory and fork fast
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1").lower() in ("1", "true", "yes")
+
+# Workers write their metric samples here so /metrics can add them up,
+# whichever worker serves it. Must exist before prometheus_client is imported.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR",
+                      os.path.join(tempfile.gettempdir(), f"score-website-metrics-{os.getpid()}"))
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+
+def on_starting(server):
+    # Samples left by a previous run would be counted again. Runs after
+    # preload_app; the master's own samples go too, but it serves nothing.
+    directory = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+
+
+def on_exit(server):
+    shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+
+
+def post_fork(server, worker):
+    if not server.cfg.preload_app:
+        return
+    from app import app, db
+
+    # Pooled connections opened in the master don't survive fork
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
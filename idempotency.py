@@ -0,0 +1,31 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class RecentKeys:
+    """A bounded, expiring set of idempotency keys seen by this process.
+
+    Keys are forgotten after `ttl` seconds, or oldest first once more than
+    `max_keys` are held.
+    """
+
+    def __init__(self, max_keys=10000, ttl=600.0):
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._keys = OrderedDict()
+
+    def claim(self, key):
+        """Remember `key`; return False if it was already seen."""
+        now = time.monotonic()
+        with self._lock:
+            # Insertion order is expiry order, so expired keys are at the front
+            while self._keys and next(iter(self._keys.values())) <= now:
+                self._keys.popitem(last=False)
+            if key in self._keys:
+                return False
+            self._keys[key] = now + self.ttl
+            if len(self._keys) > self.max_keys:
+                self._keys.popitem(last=False)
+            return True
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+from io import BytesIO
+
+from markupsafe import Markup, escape
+
+# Avatars render in a 150px circle; 2x/3x cover high-DPI screens
+SIZES = (150, 300, 450)
+FORMATS = ("webp", "jpeg")
+MANIFEST = "manifest.json"
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def _write(path, data):
+    # Several workers may build at once; rename makes each file appear whole
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _pillow():
+    # Imported only when something needs encoding, which keeps it off the
+    # worker boot path once the variants exist
+    try:
+        from PIL import Image
+    except ImportError:  # Pillow is optional; fall back to the original files
+        return None
+    return Image
+
+
+def _encode(image, fmt, width):
+    size = (width, round(image.height * width / image.width))
+    resized = image.resize(size, _pillow().LANCZOS)
+    out = BytesIO()
+    if fmt == "webp":
+        resized.save(out, "WEBP", quality=80, method=6)
+    else:
+        resized.save(out, "JPEG", quality=82, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+def build_variants(source_dir, output_dir):
+    """Write resized, content-hashed variants of each JPEG in `source_dir`.
+
+    Returns a manifest `{stem: {fmt: [[width, filename], ...]}}` with
+    filenames relative to `output_dir`. Images whose source hash matches
+    the manifest already on disk are not re-encoded; without Pillow, images
+    that would need encoding are left out.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST)
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        previous = {}
+
+    manifest = {}
+    for filename in sorted(os.listdir(source_dir)):
+        stem, ext = os.path.splitext(filename)
+        if ext.lower() not in (".jpg", ".jpeg"):
+            continue
+        with open(os.path.join(source_dir, filename), "rb") as f:
+            data = f.read()
+        source_hash = _digest(data)
+        cached = previous.get(stem)
+        if cached and cached["source"] == source_hash and all(
+                os.path.exists(os.path.join(output_dir, name))
+                for fmt in FORMATS for _, name in cached[fmt]):
+            manifest[stem] = cached
+            continue
+
+        Image = _pillow()
+        if Image is None:
+            continue
+        image = Image.open(os.path.join(source_dir, filename)).convert("RGB")
+        widths = [w for w in SIZES if w <= image.width] or [image.width]
+        entry = {"source": source_hash}
+        for fmt in FORMATS:
+            entry[fmt] = []
+            for width in widths:
+                encoded = _encode(image, fmt, width)
+                name = f"{stem}.{width}.{_digest(encoded)}.{'jpg' if fmt == 'jpeg' else fmt}"
+                _write(os.path.join(output_dir, name), encoded)
+                entry[fmt].append([width, name])
+        manifest[stem] = entry
+
+    _write(manifest_path, json.dumps(manifest, indent=2).encode())
+    return manifest
+
+
+class Avatars:
+    """Jinja helper that renders `<picture>` markup for an avatar image.
+
+    Sources are read from `<static_folder>/images` and variants written to
+    `<static_folder>/build`; `url` maps a static-relative path to its URL.
+    Names without a source image get their initial instead.
+    """
+
+    def __init__(self, static_folder, url):
+        self.url = url
+        source_dir = os.path.join(static_folder, "images")
+        self.sources = {os.path.splitext(filename)[0] for filename in os.listdir(source_dir)}
+        self.manifest = build_variants(source_dir, os.path.join(static_folder, "build"))
+
+    def __call__(self, name, alt, size=SIZES[0]):
+        style = "width: 100%; height: 100%; object-fit: cover; border-radius: 50%;"
+        variants = self.manifest.get(name)
+        if not variants and name not in self.sources:
+            return escape(alt[:1].upper())
+        if not variants:
+            return Markup(
+                f'<img src="{self.url(f"images/{name}.jpg")}" alt="{escape(alt)}" '
+                f'width="{size}" height="{size}" decoding="async" style="{style}" />')
+
+        def srcset(fmt):
+            return ", ".join(f"{self.url(f'build/{file}')} {width}w" for width, file in variants[fmt])
+
+        fallback = variants["jpeg"][0][1]
+        return Markup(
+            f'<picture>'
+            f'<source type="image/webp" srcset="{srcset("webp")}" sizes="{size}px" />'
+            f'<img src="{self.url(f"build/{fallback}")}" srcset="{srcset("jpeg")}" sizes="{size}px" '
+            f'alt="{escape(alt)}" width="{size}" height="{size}" decoding="async" style="{style}" />'
+            f'</picture>')
@@ -0,0 +1,109 @@
+import os
+import time
+
+from flask import Response, g, request
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge,
+                               Histogram, generate_latest, multiprocess)
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+# With PROMETHEUS_MULTIPROC_DIR set, every gunicorn worker writes its samples
+# to that directory and /metrics merges them, whichever worker serves it.
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by route",
+    ["method", "route", "status"])
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "Requests currently being handled",
+    ["method", "route"], multiprocess_mode="livesum")
+QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds", "SQL statement latency by statement type",
+    ["statement"], buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5))
+QUERY_ERRORS = Counter(
+    "db_query_errors_total", "SQL statements that raised", ["statement"])
+POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_seconds", "Time spent waiting for a pooled connection",
+    buckets=(.0001, .0005, .001, .005, .01, .05, .1, .5, 1, 5, 30))
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited."""
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start)
+
+
+def _statement_type(statement):
+    return statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+
+
+def instrument_engine(engine):
+    """Time every statement executed through `engine`."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info["query_start"].pop()
+        QUERY_LATENCY.labels(_statement_type(statement)).observe(time.perf_counter() - start)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        starts = context.connection.info.get("query_start") if context.connection else None
+        if starts:
+            starts.pop()
+        QUERY_ERRORS.labels(_statement_type(context.statement or "")).inc()
+
+
+def _route():
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+
+def _before_request():
+    g.metrics_start = time.perf_counter()
+    g.metrics_labels = (request.method, _route())
+    REQUESTS_IN_FLIGHT.labels(*g.metrics_labels).inc()
+
+
+def _after_request(response):
+    g.metrics_status = response.status_code
+    return response
+
+
+def _teardown_request(exc):
+    labels = g.pop("metrics_labels", None)
+    if labels is None:
+        return
+    REQUESTS_IN_FLIGHT.labels(*labels).dec()
+    status = g.pop("metrics_status", 500)
+    REQUEST_LATENCY.labels(*labels, status).observe(time.perf_counter() - g.metrics_start)
+
+
+def metrics_view():
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+def init_app(app):
+    """Register request hooks and the /metrics endpoint.
+
+    Must run before `db.init_app` so the engine picks up the timed pool.
+    """
+    options = app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", {})
+    if not app.config["SQLALCHEMY_DATABASE_URI"].endswith(":memory:"):
+        options.setdefault("poolclass", TimedQueuePool)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    app.add_url_rule("/metrics", "metrics", metrics_view)
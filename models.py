@@ -1,8 +1,710 @@
+from datetime import datetime, timedelta, timezone
+from flask import g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.schema import CreateTable
+import csv
+import io
+import os
+import random
+import threading
+
+REPLICA = "replica"
+
+
+class RoutingSession(Session):
+    """Send SELECTs to the "replica" bind while `g.read_replica` is set.
+
+    Only read-only views set the flag, and flushes always go to the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and has_app_context() and g.get("read_replica")
+                and REPLICA in self._db.engines and clause is not None and clause.is_select):
+            return self._db.engines[REPLICA]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+SQLITE_JOURNAL_MODES = {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"}
+SQLITE_SYNCHRONOUS = {"OFF", "NORMAL", "FULL", "EXTRA"}
+
+
+def _flag(env, name, default):
+    return env.get(name, default).lower() in ("1", "true", "yes")
+
+
+def engine_options(uri, env=os.environ):
+    """Build SQLALCHEMY_ENGINE_OPTIONS from DB_* environment variables.
+
+    Pre-ping and a 5 minute recycle are on by default so connections dropped
+    by the server or a proxy are replaced instead of failing a request.
+    """
+    options = {
+        "pool_pre_ping": _flag(env, "DB_POOL_PRE_PING", "1"),
+        "pool_recycle": int(env.get("DB_POOL_RECYCLE", 300)),
+    }
+    for option, name in (("pool_size", "DB_POOL_SIZE"),
+                         ("max_overflow", "DB_MAX_OVERFLOW"),
+                         ("pool_timeout", "DB_POOL_TIMEOUT")):
+        if name in env:
+            options[option] = int(env[name])
+    if uri.startswith("postgres") and env.get("DB_STATEMENT_TIMEOUT_MS"):
+        timeout = int(env["DB_STATEMENT_TIMEOUT_MS"])
+        options["connect_args"] = {"options": f"-c statement_timeout={timeout}"}
+    return options
+
+
+def configure_engine(engine, env=os.environ):
+    """Set SQLite pragmas on every new connection and queue this process's writers.
+
+    WAL lets readers proceed while a write is in progress, synchronous=NORMAL
+    skips the fsync per commit that WAL makes unnecessary for consistency,
+    and the busy timeout makes writers wait for the lock instead of failing.
+    Must run before the engine opens its first connection.
+
+    SQLite's busy handler polls with sleeps of up to 100 ms, so with many
+    threads writing, one can keep missing its turn until the timeout and
+    fail with "database is locked". Writers in one process therefore take
+    a lock before their first write and hold it until the transaction ends,
+    so they wait in line; the busy timeout still covers other processes.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    journal_mode = env.get("SQLITE_JOURNAL_MODE", "WAL").upper()
+    synchronous = env.get("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+    busy_timeout = int(env.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+    if journal_mode not in SQLITE_JOURNAL_MODES or synchronous not in SQLITE_SYNCHRONOUS:
+        raise ValueError(f"Invalid SQLite settings: journal_mode={journal_mode}, "
+                         f"synchronous={synchronous}")
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA journal_mode={journal_mode}")
+        cursor.execute(f"PRAGMA synchronous={synchronous}")
+        cursor.execute(f"PRAGMA busy_timeout={busy_timeout}")
+        cursor.close()
+
+    write_lock = threading.Lock()
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def queue_writer(conn, cursor, statement, parameters, context, executemany):
+        if "writing" in conn.info or statement.lstrip()[:6].upper() in ("SELECT", "PRAGMA"):
+            return
+        # On timeout, go ahead and leave it to the busy handler as before
+        conn.info["writing"] = write_lock.acquire(timeout=busy_timeout / 1000)
+
+    def end_write(info):
+        if info.pop("writing", False):
+            write_lock.release()
+
+    # Released just before COMMIT runs; the next writer's busy handler covers the gap
+    @event.listens_for(engine, "commit")
+    @event.listens_for(engine, "rollback")
+    def end_transaction(conn):
+        end_write(conn.info)
+
+    # Connections returned or reset by the pool without an explicit rollback
+    @event.listens_for(engine.pool, "reset")
+    def reset(dbapi_connection, connection_record, reset_state):
+        end_write(connection_record.info)
+
+    @event.listens_for(engine.pool, "checkin")
+    def checkin(dbapi_connection, connection_record):
+        if connection_record is not None:
+            end_write(connection_record.info)
+
+# Rows written without a board, including everything from before boards existed
+DEFAULT_BOARD = "default"
+
+
+def _board_column(**kwargs):
+    return db.Column(db.String(64), nullable=False, default=DEFAULT_BOARD,
+                     server_default=DEFAULT_BOARD, **kwargs)
+
+
+def _version_column():
+    # Bumped by the same upsert that changes the row, so it costs no extra lock
+    return db.Column(db.BigInteger, nullable=False, default=0, server_default="0")
 
-db = SQLAlchemy()
 
 class Score(db.Model):
+    """A name's compacted total.
+
+    `version` counts the writes folded into the row. A name's version is
+    that plus its shards' versions (see `all_scores`); it grows with every
+    write to the name, in commit order.
+    """
     id = db.Column(db.Integer, primary_key=True)
+    board_id = _board_column()
     name = db.Column(db.String(50), nullable=False)
     score = db.Column(db.Integer, nullable=False)
+    version = _version_column()
+
+    __table_args__ = (
+        db.Index("ix_score_board_id_name", board_id, name, unique=True),
+        # Serves top-N pages and rank counts without sorting the whole board
+        db.Index("ix_score_board_id_score_desc_id", board_id, score.desc(), id),
+    )
+
+
+class ScoreShard(db.Model):
+    """Increments for `name` not yet folded into its `Score` row.
+
+    In sharded mode each increment lands on one of several rows per name,
+    so concurrent writers to a popular name don't queue on one row lock.
+    `compact_shards` moves the deltas back into `Score`.
+    """
+    board_id = _board_column(primary_key=True)
+    name = db.Column(db.String(50), primary_key=True)
+    shard = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    delta = db.Column(db.Integer, nullable=False)
+    version = _version_column()
+
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class ScoreEvent(db.Model):
+    """One applied score change, written in the same transaction as the total."""
+    id = db.Column(db.Integer, primary_key=True)
+    board_id = _board_column()
+    name = db.Column(db.String(50), nullable=False)
+    delta = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+    client_id = db.Column(db.String(64))
+
+    __table_args__ = (db.Index("ix_score_event_board_id_name_created_at", "board_id", "name", "created_at"),)
+
+
+class IdempotencyKey(db.Model):
+    """A client-chosen request key, claimed in the same transaction as its write."""
+    key = db.Column(db.String(64), primary_key=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow, index=True)
+
+
+class ScoreCheckpoint(db.Model):
+    """A name's absolute total as of `created_at`.
+
+    Written by `/api/submit` and by `compact_events`, which folds older
+    events into a checkpoint and deletes them.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    board_id = _board_column()
+    name = db.Column(db.String(50), nullable=False)
+    total = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+
+    __table_args__ = (db.Index("ix_score_checkpoint_board_id_name_created_at",
+                               "board_id", "name", "created_at"),)
+
+
+class ScoreRollup(db.Model):
+    """A name's summed increments within one day, week or month (UTC).
+
+    Updated by the write path so windowed leaderboards are a single index
+    range scan instead of an aggregate over `ScoreEvent`.
+    """
+    board_id = _board_column(primary_key=True)
+    window = db.Column(db.String(8), primary_key=True)
+    bucket = db.Column(db.Date, primary_key=True)
+    name = db.Column(db.String(50), primary_key=True)
+    total = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (db.Index("ix_score_rollup_board_id_window_bucket_total",
+                               board_id, window, bucket, total.desc()),)
+
+
+WINDOWS = ("day", "week", "month")
+
+
+def bucket_start(window, at):
+    """Return the first day of the `window` bucket containing `at`."""
+    day = at.date()
+    if window == "week":
+        return day - timedelta(days=day.weekday())
+    if window == "month":
+        return day.replace(day=1)
+    return day
+
+
+def record_rollups(changes, at=None, board=DEFAULT_BOARD):
+    """Add each `{name: delta}` to the current day, week and month buckets.
+
+    One multi-row upsert for all of them, keeping the write path's statement
+    count down. Names are listed in sorted order, the same lock order as `Score`.
+    """
+    if not changes:
+        return
+    at = at or utcnow()
+    changes = by_name(changes)
+    stmt = upsert(ScoreRollup).values([
+        {"board_id": board, "window": window, "bucket": bucket_start(window, at), "name": name,
+         "total": changes[name]}
+        for name in sorted(changes) for window in WINDOWS
+    ])
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[ScoreRollup.board_id, ScoreRollup.window, ScoreRollup.bucket, ScoreRollup.name],
+        set_={"total": ScoreRollup.total + stmt.excluded.total},
+    ))
+
+
+def window_scores(window, limit, at=None, board=DEFAULT_BOARD):
+    """Return the top `limit` `(name, total)` rows of the current `window` bucket."""
+    bucket = bucket_start(window, at or utcnow())
+    return (db.session.query(ScoreRollup.name, ScoreRollup.total)
+            .filter(ScoreRollup.board_id == board, ScoreRollup.window == window,
+                    ScoreRollup.bucket == bucket)
+            .order_by(ScoreRollup.total.desc())
+            .limit(limit).all())
+
+
+def create_schema():
+    """Create missing tables and indexes.
+
+    `create_all` skips tables that already exist, so indexes added after a
+    table was first deployed (e.g. the unique index on `Score.name`) are
+    created explicitly here, and tables from before boards are upgraded.
+    """
+    _add_board_ids()
+    _merge_duplicate_scores()
+    _add_versions()
+    db.create_all()
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+    _lowercase_names()
+
+
+def by_name(changes):
+    """Merge `{name: delta}` under lowercased names; `Bob` and `bob` are one person."""
+    merged = {}
+    for name, delta in changes.items():
+        merged[name.lower()] = merged.get(name.lower(), 0) + delta
+    return merged
+
+
+def _merge_duplicate_scores():
+    """Fold `Score` rows sharing a board and name into the oldest one, summing them.
+
+    The original `/api/submit` inserted a row per call, so databases from
+    before the unique index can hold duplicates that would make creating it
+    fail. Runs after `_add_board_ids`, whose rebuilt tables don't have the
+    index yet, and only until the index exists.
+    """
+    inspector = db.inspect(db.engine)
+    if "score" not in inspector.get_table_names() or any(
+            index["name"] == "ix_score_board_id_name" for index in inspector.get_indexes("score")):
+        return
+    table = Score.__table__
+    key = [table.c.board_id, table.c.name]
+    with db.engine.begin() as conn:
+        duplicates = conn.execute(
+            db.select(*key, db.func.min(table.c.id), db.func.sum(table.c.score))
+            .group_by(*key).having(db.func.count() > 1)
+        ).all()
+        for *values, keep, total in duplicates:
+            match = [column == value for column, value in zip(key, values)]
+            conn.execute(db.delete(table).where(*match, table.c.id != keep))
+            conn.execute(db.update(table).where(table.c.id == keep).values(score=total))
+
+
+def _add_versions():
+    """Add the `version` column to score tables created before it existed."""
+    inspector = db.inspect(db.engine)
+    existing = set(inspector.get_table_names())
+    for table in (Score.__table__, ScoreShard.__table__):
+        if table.name not in existing:
+            continue
+        if any(column["name"] == "version" for column in inspector.get_columns(table.name)):
+            continue
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN version BIGINT NOT NULL DEFAULT 0")
+
+
+def _lowercase_names():
+    """Fold rows stored under a name that isn't lowercase into the lowercase name's.
+
+    Names used to be stored as sent and only lowercased when read, so `Bob`
+    and `bob` could have separate rows that the leaderboard showed as one.
+    Names are compared in Python, whose lowercasing the write path uses.
+    """
+    with db.engine.begin() as conn:
+        mixed = {(board, name)
+                 for model in (Score, ScoreShard)
+                 for board, name in conn.execute(db.select(model.board_id, model.name).distinct())
+                 if name != name.lower()}
+        for board, name in sorted(mixed):
+            lower = name.lower()
+            for model, key, values in (
+                    (Score, ["board_id", "name"], ["score", "version"]),
+                    (ScoreShard, ["board_id", "name", "shard"], ["delta", "version"]),
+                    (ScoreRollup, ["board_id", "window", "bucket", "name"], ["total"])):
+                table = model.__table__
+                rows = conn.execute(
+                    db.delete(table).where(table.c.board_id == board, table.c.name == name)
+                    .returning(*(table.c[column] for column in key + values))
+                ).mappings().all()
+                for row in rows:
+                    stmt = upsert(table).values(dict(row, name=lower))
+                    conn.execute(stmt.on_conflict_do_update(
+                        index_elements=[table.c[column] for column in key],
+                        set_={column: table.c[column] + stmt.excluded[column] for column in values},
+                    ))
+            for model in (ScoreEvent, ScoreCheckpoint):
+                conn.execute(db.update(model.__table__)
+                             .where(model.board_id == board, model.name == name).values(name=lower))
+
+
+def _add_board_ids():
+    """Rebuild tables created before boards, moving their rows to the default board.
+
+    A rebuild rather than ADD COLUMN, because primary keys and unique
+    indexes that didn't include the board have to be replaced too.
+    """
+    inspector = db.inspect(db.engine)
+    existing = set(inspector.get_table_names())
+    for table in db.metadata.sorted_tables:
+        if "board_id" not in table.c or table.name not in existing:
+            continue
+        columns = [column["name"] for column in inspector.get_columns(table.name)]
+        if "board_id" in columns:
+            continue
+        copied = [name for name in columns if name in table.c]
+        staging = table.to_metadata(db.MetaData(), name=f"{table.name}_boards")
+        with db.engine.begin() as conn:
+            old = db.Table(table.name, db.MetaData(), autoload_with=conn)
+            conn.execute(CreateTable(staging))
+            conn.execute(staging.insert().from_select(copied, db.select(*(old.c[name] for name in copied))))
+            old.drop(conn)
+            conn.exec_driver_sql(f"ALTER TABLE {staging.name} RENAME TO {table.name}")
+            if conn.dialect.name == "postgresql" and "id" in copied:
+                # Rows were copied with their ids, so move the sequence past them
+                conn.exec_driver_sql(f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                                     f"COALESCE(MAX(id), 0) + 1, false) FROM {table.name}")
+
+
+def upsert(model):
+    """Return a dialect-specific INSERT that supports ON CONFLICT clauses."""
+    if db.engine.dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+
+def increment_score(name, change, shards=1, board=DEFAULT_BOARD):
+    """Atomically add `change` to `name`'s score, creating the row if needed.
+
+    Runs as a single INSERT ... ON CONFLICT DO UPDATE ... RETURNING, so
+    concurrent callers never lose an update. Returns the new
+    `(total, version)`. With `shards` > 1 the change goes to a random
+    `ScoreShard` row instead, and the total includes the other shards.
+    Names are stored lowercased.
+    """
+    name = name.lower()
+    if shards > 1:
+        stmt = upsert(ScoreShard).values(
+            board_id=board, name=name, shard=random.randrange(shards), delta=change, version=1)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[ScoreShard.board_id, ScoreShard.name, ScoreShard.shard],
+            set_={"delta": ScoreShard.delta + stmt.excluded.delta, "version": ScoreShard.version + 1},
+        ))
+        return score_total(name, board)
+    return _add_to_score(name, change, 1, board)
+
+
+def _add_to_score(name, change, versions, board):
+    stmt = upsert(Score).values(board_id=board, name=name, score=change, version=versions)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Score.board_id, Score.name],
+        set_={"score": Score.score + stmt.excluded.score, "version": Score.version + stmt.excluded.version},
+    ).returning(Score.score, Score.version)
+    return tuple(db.session.execute(stmt).one())
+
+
+def _name_totals(board, *names):
+    """Return a select of `(name, total, version)` per name on `board`, shards included."""
+    compacted = db.select(Score.name, Score.score.label("total"), Score.version).where(Score.board_id == board)
+    sharded = db.select(ScoreShard.name, ScoreShard.delta, ScoreShard.version).where(ScoreShard.board_id == board)
+    if names:
+        compacted = compacted.where(Score.name.in_(names))
+        sharded = sharded.where(ScoreShard.name.in_(names))
+    # One statement, so both tables are read from the same snapshot
+    rows = db.union_all(compacted, sharded).subquery()
+    return (db.select(rows.c.name, db.func.sum(rows.c.total), db.func.sum(rows.c.version))
+            .group_by(rows.c.name))
+
+
+def score_total(name, board=DEFAULT_BOARD):
+    """Return `name`'s `(total, version)`: its compacted score plus its uncompacted shards."""
+    name = name.lower()
+    row = db.session.execute(_name_totals(board, name)).first()
+    return (int(row[1]), int(row[2])) if row else (0, 0)
+
+
+def all_scores(board=DEFAULT_BOARD):
+    """Return a board's `(name, total, version)` rows including uncompacted shards, highest first."""
+    rows = [(name, int(total), int(version))
+            for name, total, version in db.session.execute(_name_totals(board))]
+    return sorted(rows, key=lambda row: row[1], reverse=True)
+
+
+def _fold_shards(name, board):
+    """Move `name`'s shards into its `Score` row and the rollups.
+
+    The shards' versions are added to the row's, so the name's version
+    doesn't change. Returns the new `(total, version)`, or None if there
+    were no shards.
+    """
+    rows = db.session.execute(
+        db.delete(ScoreShard)
+        .where(ScoreShard.board_id == board, ScoreShard.name == name)
+        .returning(ScoreShard.delta, ScoreShard.version)
+    ).all()
+    if not rows:
+        return None
+    delta = sum(row.delta for row in rows)
+    record_rollups({name: delta}, board=board)
+    return _add_to_score(name, delta, sum(row.version for row in rows), board)
+
+
+def compact_shards():
+    """Fold every `ScoreShard` row into its `Score` row and the rollups.
+
+    In sharded mode writers leave the rollups to this, so their rows don't
+    become a hot spot again; increments land in the bucket current at
+    compaction time. Names are handled in sorted order, the same lock order
+    writers use. Returns `(board, name, total, version)` for each name
+    compacted. Does not commit.
+    """
+    keys = db.session.query(ScoreShard.board_id, ScoreShard.name).distinct().all()
+    compacted = []
+    for board, name in sorted(keys):
+        folded = _fold_shards(name, board)
+        if folded:
+            compacted.append((board, name, *folded))
+    return compacted
+
+
+def set_score(name, value, board=DEFAULT_BOARD):
+    """Set `name`'s score to `value`, creating the row if needed; return its new version."""
+    name = name.lower()
+    _fold_shards(name, board)
+    stmt = upsert(Score).values(board_id=board, name=name, score=value, version=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Score.board_id, Score.name],
+        set_={"score": stmt.excluded.score, "version": Score.version + 1},
+    ).returning(Score.version)
+    version = db.session.execute(stmt).scalar_one()
+    db.session.add(ScoreCheckpoint(board_id=board, name=name, total=value))
+    return version
+
+
+def bulk_set_scores(rows, board=DEFAULT_BOARD):
+    """Set many scores at once from `(name, score)` pairs; a later pair wins.
+
+    Postgres loads the batch with COPY into a temporary table and merges it
+    with one INSERT ... SELECT; SQLite uses a plain DBAPI executemany. Each
+    name also gets a checkpoint so `history` stays correct. Does not commit.
+    """
+    scores = {name.lower(): score for name, score in rows}
+    if not scores:
+        return
+    if db.session.query(ScoreShard.name).first() is not None:
+        # Folded rather than deleted, so the names' versions keep growing
+        for name in sorted(db.session.scalars(
+                db.select(ScoreShard.name).distinct()
+                .where(ScoreShard.board_id == board, ScoreShard.name.in_(scores)))):
+            _fold_shards(name, board)
+    if db.engine.dialect.name == "postgresql":
+        _copy_scores(scores, utcnow(), board)
+    else:
+        _executemany_scores(scores, utcnow(), board)
+
+
+def _copy_scores(scores, now, board):
+    def csv_buffer(rows):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        return buffer
+
+    cursor = db.session.connection().connection.driver_connection.cursor()
+    try:
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS score_import (name varchar(50), score integer)")
+        cursor.copy_expert("COPY score_import (name, score) FROM STDIN WITH (FORMAT csv)",
+                           csv_buffer(scores.items()))
+        cursor.execute(f"INSERT INTO {Score.__table__.name} (board_id, name, score, version) "
+                       "SELECT %s, name, score, 1 FROM score_import "
+                       "ON CONFLICT (board_id, name) DO UPDATE "
+                       f"SET score = EXCLUDED.score, version = {Score.__table__.name}.version + 1",
+                       (board,))
+        cursor.execute("TRUNCATE score_import")
+        cursor.copy_expert(f"COPY {ScoreCheckpoint.__table__.name} (board_id, name, total, created_at) "
+                           "FROM STDIN WITH (FORMAT csv)",
+                           csv_buffer((board, name, score, now.isoformat())
+                                      for name, score in scores.items()))
+    finally:
+        cursor.close()
+
+
+def _executemany_scores(scores, now, board):
+    # SQLAlchemy's per-row parameter processing costs more than the inserts
+    connection = db.session.connection()
+    connection.exec_driver_sql(
+        f"INSERT INTO {Score.__table__.name} (board_id, name, score, version) VALUES (?, ?, ?, 1) "
+        "ON CONFLICT (board_id, name) DO UPDATE "
+        f"SET score = excluded.score, version = {Score.__table__.name}.version + 1",
+        [(board, name, score) for name, score in scores.items()])
+    # The same text format SQLAlchemy's SQLite DateTime type stores
+    stamp = now.isoformat(" ", "microseconds")
+    connection.exec_driver_sql(
+        f"INSERT INTO {ScoreCheckpoint.__table__.name} (board_id, name, total, created_at) "
+        "VALUES (?, ?, ?, ?)",
+        [(board, name, score, stamp) for name, score in scores.items()])
+
+
+def top_scores(limit, offset=0, board=DEFAULT_BOARD):
+    """Return one page of a board's `(name, score)` rows, highest first.
+
+    Reads compacted totals only, so in sharded mode it trails by up to one
+    compaction interval.
+    """
+    return (db.session.query(Score.name, Score.score)
+            .filter(Score.board_id == board)
+            .order_by(Score.score.desc(), Score.id)
+            .limit(limit).offset(offset).all())
+
+
+def _neighbours(board, tied, beyond, order, limit):
+    """Return up to `limit` rows walking away from an entry in `order`."""
+    rows = (db.session.query(Score.name, Score.score).filter(Score.board_id == board, *tied)
+            .order_by(*order).limit(limit).all())
+    if len(rows) < limit:
+        rows += (db.session.query(Score.name, Score.score).filter(Score.board_id == board, *beyond)
+                 .order_by(*order).limit(limit - len(rows)).all())
+    return rows
+
+
+def rank(name, neighbours=2, board=DEFAULT_BOARD):
+    """Return `name`'s 1-based rank and up to `neighbours` rows either side.
+
+    Ties share a rank. The rank is a range count over the board's
+    `(score DESC, id)` index and the neighbours are short walks along it from
+    `name`'s entry, so nothing loads the whole board. Like `top_scores`, it
+    ignores uncompacted shards. Returns None if `name` has no score.
+    """
+    me = Score.query.filter_by(board_id=board, name=name.lower()).first()
+    if me is None:
+        return None
+    position = db.session.query(db.func.count(Score.id)).filter(
+        Score.board_id == board, Score.score > me.score).scalar() + 1
+    # Each side is two plain index seeks; an OR of both ranges would make
+    # the database sort every row above (or below) `name` first.
+    above = _neighbours(
+        board, [Score.score == me.score, Score.id < me.id], [Score.score > me.score],
+        (Score.score, Score.id.desc()), neighbours)
+    below = _neighbours(
+        board, [Score.score == me.score, Score.id > me.id], [Score.score < me.score],
+        (Score.score.desc(), Score.id), neighbours)
+    return {
+        "name": me.name,
+        "score": me.score,
+        "rank": position,
+        "above": [{"name": n, "score": s} for n, s in reversed(above)],
+        "below": [{"name": n, "score": s} for n, s in below],
+    }
+
+
+def record_events(changes, client_id=None, board=DEFAULT_BOARD):
+    """Append one `ScoreEvent` per `{name: delta}` to the current transaction."""
+    if changes:
+        now = utcnow()
+        db.session.execute(db.insert(ScoreEvent), [
+            {"board_id": board, "name": name, "delta": delta, "created_at": now, "client_id": client_id}
+            for name, delta in by_name(changes).items()
+        ])
+
+
+def claim_key(key):
+    """Record idempotency `key` in the current transaction.
+
+    Returns False if the key was already used. A concurrent claim of the
+    same key waits on the primary key until the first transaction ends.
+    """
+    stmt = upsert(IdempotencyKey).values(key=key, created_at=utcnow())
+    return db.session.execute(
+        stmt.on_conflict_do_nothing(index_elements=[IdempotencyKey.key]).returning(IdempotencyKey.key)
+    ).first() is not None
+
+
+def expire_keys(before):
+    """Delete idempotency keys claimed before `before`. Does not commit."""
+    return IdempotencyKey.query.filter(IdempotencyKey.created_at < before).delete(synchronize_session=False)
+
+
+def _latest_checkpoint(name, at, board):
+    return (ScoreCheckpoint.query
+            .filter(ScoreCheckpoint.board_id == board, ScoreCheckpoint.name == name,
+                    ScoreCheckpoint.created_at <= at)
+            .order_by(ScoreCheckpoint.created_at.desc())
+            .first())
+
+
+def total_at(name, at, board=DEFAULT_BOARD):
+    """Return `name`'s total as of `at`: the latest checkpoint plus later events."""
+    name = name.lower()
+    checkpoint = _latest_checkpoint(name, at, board)
+    query = db.session.query(db.func.coalesce(db.func.sum(ScoreEvent.delta), 0)).filter(
+        ScoreEvent.board_id == board, ScoreEvent.name == name, ScoreEvent.created_at <= at)
+    if checkpoint:
+        query = query.filter(ScoreEvent.created_at > checkpoint.created_at)
+    return (checkpoint.total if checkpoint else 0) + query.scalar()
+
+
+def history(name, since, limit=1000, board=DEFAULT_BOARD):
+    """Return `name`'s total at `since` and the checkpoints and events after it.
+
+    Every query is a range scan on a `(board_id, name, created_at)` index.
+    """
+    name = name.lower()
+    checkpoints = (ScoreCheckpoint.query
+                   .filter(ScoreCheckpoint.board_id == board, ScoreCheckpoint.name == name,
+                           ScoreCheckpoint.created_at > since)
+                   .order_by(ScoreCheckpoint.created_at)
+                   .limit(limit).all())
+    events = (ScoreEvent.query
+              .filter(ScoreEvent.board_id == board, ScoreEvent.name == name,
+                      ScoreEvent.created_at > since)
+              .order_by(ScoreEvent.created_at, ScoreEvent.id)
+              .limit(limit).all())
+    return {
+        "name": name,
+        "since": since.isoformat(),
+        "start_total": total_at(name, since, board),
+        "checkpoints": [{"at": c.created_at.isoformat(), "total": c.total} for c in checkpoints],
+        "events": [{"at": e.created_at.isoformat(), "delta": e.delta, "client_id": e.client_id}
+                   for e in events],
+    }
+
+
+def compact_events(before):
+    """Fold events older than `before` into one checkpoint per board and name.
+
+    Returns the number of events deleted. Does not commit.
+    """
+    keys = (db.session.query(ScoreEvent.board_id, ScoreEvent.name)
+            .filter(ScoreEvent.created_at < before).distinct().all())
+    deleted = 0
+    for board, name in keys:
+        db.session.add(ScoreCheckpoint(board_id=board, name=name, total=total_at(name, before, board),
+                                       created_at=before))
+        deleted += (ScoreEvent.query
+                    .filter(ScoreEvent.board_id == board, ScoreEvent.name == name,
+                            ScoreEvent.created_at < before)
+                    .delete(synchronize_session=False))
+    return deleted
@@ -0,0 +1,199 @@
+import hashlib
+import json
+import logging
+import os
+import select
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+
+from background import ProcessThread
+
+log = logging.getLogger(__name__)
+
+# Postgres caps NOTIFY payloads at 8000 bytes
+MAX_PAYLOAD = 7900
+
+
+class ChangeNotifier(ABC):
+    """Tell every other worker process that scores changed.
+
+    The write path calls `committed(board, totals, versions)` after each
+    commit. Each worker runs one listener thread that calls
+    `on_change(board, totals, versions)` for changes made by other workers;
+    `totals` is None when the change was too large to describe, meaning
+    "reload the board", and `board` None means every board.
+    """
+
+    def __init__(self, on_change):
+        self.on_change = on_change
+        self.origin = None
+        self._thread = ProcessThread(self._run, "change-listener", setup=self._set_origin)
+
+    def start(self):
+        """Start this process's listener thread; safe to call on every request."""
+        self._thread.start()
+
+    def _set_origin(self):
+        # Unique across hosts and pid reuse, so workers never drop each other's messages
+        self.origin = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex}"
+
+    def _message(self, board, totals, versions):
+        message = {"origin": self.origin, "board": board, "totals": totals, "versions": versions}
+        payload = json.dumps(message, separators=(",", ":"))
+        if len(payload) > MAX_PAYLOAD:
+            payload = json.dumps(dict(message, totals=None, versions=None))
+        return payload
+
+    def _receive(self, payload):
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            return
+        if message.get("origin") != self.origin:
+            self.on_change(message.get("board"), message.get("totals"), message.get("versions"))
+
+    @abstractmethod
+    def committed(self, board, totals, versions=None):
+        """Announce a committed change to the other workers."""
+
+    @abstractmethod
+    def _run(self):
+        """Listen for other workers' changes, calling `_receive` with each payload."""
+
+
+class PostgresNotifier(ChangeNotifier):
+    """LISTEN/NOTIFY on `channel`.
+
+    A transaction that notifies takes a database-wide lock at commit and
+    holds it through the WAL flush, so NOTIFY is kept out of the write
+    transactions: it is sent after they commit, on a connection of its own.
+    Messages queued while another thread is sending go out together in
+    that thread's next transaction. A message lost to a failed send is
+    covered by the leaderboard cache TTL.
+    """
+
+    def __init__(self, engine, on_change, channel="score_changes"):
+        super().__init__(on_change)
+        self.engine = engine
+        self.channel = channel
+        self._queue = []
+        self._queue_lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+
+    def committed(self, board, totals, versions=None):
+        with self._queue_lock:
+            self._queue.append(self._message(board, totals, versions))
+        # Whoever holds the sender also sends what others queued meanwhile
+        while self._send_lock.acquire(blocking=False):
+            try:
+                with self._queue_lock:
+                    batch, self._queue = self._queue, []
+                if batch:
+                    self._send(batch)
+            finally:
+                self._send_lock.release()
+            with self._queue_lock:
+                if not self._queue:
+                    return
+
+    def _send(self, payloads):
+        try:
+            if self._conn is None or self._conn_pid != os.getpid():
+                # Detached like the listener's; a parent's connection is left alone after fork
+                proxied = self.engine.raw_connection()
+                proxied.detach()
+                self._conn, self._conn_pid = proxied.driver_connection, os.getpid()
+            with self._conn.cursor() as cursor:
+                for payload in payloads:
+                    cursor.execute("SELECT pg_notify(%s, %s)", (self.channel, payload))
+            self._conn.commit()
+        except Exception:
+            log.exception("Could not send %d change notifications", len(payloads))
+            if self._conn is not None:
+                try:
+                    self._conn.close()
+                except Exception:
+                    pass
+                self._conn = None
+
+    def _run(self):
+        while True:
+            try:
+                self._listen()
+            except Exception:
+                log.exception("Change listener lost its connection; reconnecting")
+            # Anything sent while disconnected was missed
+            self.on_change(None, None, None)
+            time.sleep(1)
+
+    def _listen(self):
+        # A dedicated connection, detached so it never goes back to the pool
+        proxied = self.engine.raw_connection()
+        proxied.detach()
+        conn = proxied.driver_connection
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f'LISTEN "{self.channel}"')
+            while True:
+                if select.select([conn], [], [], 30) == ([], [], []):
+                    # Idle; a round trip detects a dead connection
+                    with conn.cursor() as cursor:
+                        cursor.execute("SELECT 1")
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    self._receive(conn.notifies.pop(0).payload)
+        finally:
+            conn.close()
+
+
+class SocketNotifier(ChangeNotifier):
+    """Stand-in for LISTEN/NOTIFY on one host, e.g. for the SQLite fallback.
+
+    Every worker binds a Unix datagram socket in `directory`; a commit sends
+    one datagram to each socket there.
+    """
+
+    def __init__(self, directory, on_change):
+        super().__init__(on_change)
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+
+    def committed(self, board, totals, versions=None):
+        payload = self._message(board, totals, versions).encode()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                self._sender.sendto(payload, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # The worker that owned this socket is gone
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+            except OSError:
+                log.warning("Could not notify %s", path, exc_info=True)
+
+    def _run(self):
+        path = os.path.join(self.directory, f"{os.getpid()}-{uuid.uuid4().hex[:8]}.sock")
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.bind(path)
+            try:
+                while True:
+                    self._receive(sock.recv(65536).decode())
+            finally:
+                os.unlink(path)
+
+
+def socket_directory(database_uri):
+    """Per-database socket directory, so separate apps on one host don't mix."""
+    digest = hashlib.sha1(database_uri.encode()).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f"score-website-{digest}")
@@ -0,0 +1,161 @@
+import atexit
+import cProfile
+import glob
+import hashlib
+import hmac
+import os
+import pstats
+import random
+import re
+import tempfile
+import threading
+import time
+
+import click
+from flask import g, request
+from flask.cli import AppGroup
+
+# Profile this fraction of requests; 0 turns random sampling off
+SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+# With a secret set, a request can also ask for profiling with a signed X-Profile header
+SECRET = os.environ.get("PROFILE_SECRET", "")
+DIRECTORY = os.environ.get("PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "score-website-profiles")
+MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", "200"))
+FLUSH_INTERVAL = float(os.environ.get("PROFILE_FLUSH_INTERVAL", "60"))
+
+# cProfile hooks the whole interpreter, so one request is profiled at a time
+_profiler_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {}
+_flushed_at = time.monotonic()
+
+
+def sign(expires, secret=SECRET):
+    """Return the X-Profile signature for a header valid until `expires` (Unix time)."""
+    return hmac.new(secret.encode(), str(expires).encode(), hashlib.sha256).hexdigest()
+
+
+def _header_requested():
+    value = request.headers.get("X-Profile")
+    if not value or not SECRET:
+        return False
+    expires, _, signature = value.partition(":")
+    try:
+        expires = int(expires)
+    except ValueError:
+        return False
+    return expires > time.time() and hmac.compare_digest(signature, sign(expires))
+
+
+def _slug():
+    rule = request.url_rule.rule if request.url_rule else "unmatched"
+    return f"{request.method}_{re.sub(r'[^A-Za-z0-9]+', '_', rule).strip('_') or 'root'}"
+
+
+def _before_request():
+    if not ((SAMPLE_RATE and random.random() < SAMPLE_RATE) or _header_requested()):
+        return
+    # Skip rather than wait while another request is being profiled
+    if not _profiler_lock.acquire(blocking=False):
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiling tool is active
+        _profiler_lock.release()
+        return
+    g.profiler = profiler
+
+
+def _teardown_request(exc):
+    profiler = g.pop("profiler", None)
+    if profiler is None:
+        return
+    profiler.disable()
+    _profiler_lock.release()
+
+    global _flushed_at
+    slug = _slug()
+    with _stats_lock:
+        if slug in _stats:
+            _stats[slug][0].add(profiler)
+            _stats[slug][1] += 1
+        else:
+            _stats[slug] = [pstats.Stats(profiler), 1]
+        due = time.monotonic() - _flushed_at >= FLUSH_INTERVAL
+        if due:
+            _flushed_at = time.monotonic()
+    if due:
+        flush()
+
+
+def flush():
+    """Write each route's aggregated profile to DIRECTORY and drop the oldest files.
+
+    Files are named `<route>.<time in ns>.<pid>.<requests>.prof`.
+    """
+    global _stats
+    with _stats_lock:
+        stats, _stats = _stats, {}
+    if not stats:
+        return
+    os.makedirs(DIRECTORY, exist_ok=True)
+    now = time.time_ns()
+    for slug, (route_stats, requests) in stats.items():
+        route_stats.dump_stats(os.path.join(DIRECTORY, f"{slug}.{now}.{os.getpid()}.{requests}.prof"))
+    files = sorted(glob.glob(os.path.join(DIRECTORY, "*.prof")), key=os.path.getmtime)
+    for path in files[:max(len(files) - MAX_FILES, 0)]:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+profile_cli = AppGroup("profile", help="Inspect request profiles.")
+
+
+@profile_cli.command("summary")
+@click.option("--route", default="", help="Only routes whose name contains this, e.g. api_update.")
+@click.option("--sort", default="cumulative", show_default=True,
+              type=click.Choice(["cumulative", "tottime", "calls"]))
+@click.option("--limit", default=25, show_default=True, help="Functions to show per route.")
+def summary_command(route, sort, limit):
+    """Show the hottest functions per route from the saved profiles."""
+    by_route = {}
+    for path in glob.glob(os.path.join(DIRECTORY, "*.prof")):
+        slug, _, _, requests, _ = os.path.basename(path).rsplit(".", 4)
+        if route in slug:
+            by_route.setdefault(slug, []).append((path, int(requests)))
+    if not by_route:
+        raise click.ClickException(f"No profiles in {DIRECTORY}")
+    for slug, files in sorted(by_route.items()):
+        stats = pstats.Stats(*(path for path, _ in files), stream=click.get_text_stream("stdout"))
+        requests = sum(count for _, count in files)
+        click.echo(f"== {slug}: {requests} requests, {stats.total_tt / requests * 1000:.2f} ms "
+                   f"profiled per request ==")
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+
+
+@profile_cli.command("sign")
+@click.option("--ttl", default=300, show_default=True, help="Seconds the header stays valid.")
+def sign_command(ttl):
+    """Print an X-Profile header value that requests profiling of one request."""
+    if not SECRET:
+        raise click.ClickException("PROFILE_SECRET is not set")
+    expires = int(time.time()) + ttl
+    click.echo(f"X-Profile: {expires}:{sign(expires)}")
+
+
+def init_app(app):
+    """Add the `flask profile` commands, and the request hooks if profiling is enabled.
+
+    With neither PROFILE_SAMPLE_RATE nor PROFILE_SECRET set no hooks are
+    registered, so requests pay nothing.
+    """
+    app.cli.add_command(profile_cli)
+    if not (SAMPLE_RATE or SECRET):
+        return
+    app.before_request(_before_request)
+    app.teardown_request(_teardown_request)
+    atexit.register(flush)
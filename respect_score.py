@@ -1,29 +1,32 @@
-import os
-import json
-from flask import Flask, request, jsonify, render_template_string
+import threading
+from flask import Flask, Response, request, jsonify, render_template_string
+from broadcast import Broadcaster
+from score_store import ScoreStore
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
 
 SCORES_FILE = 'scores.json'
 
-# Load scores from file or initialize them
-def load_scores():
-    if not os.path.exists(SCORES_FILE):
-        with open(SCORES_FILE, 'w') as f:
-            json.dump({"ali": 0, "hamza": 0, "yasir": 0}, f)
-    with open(SCORES_FILE, 'r') as f:
-        return json.load(f)
+broadcaster = Broadcaster()
 
-# Save scores to file
-def save_scores(scores):
-    with open(SCORES_FILE, 'w') as f:
-        json.dump(scores, f)
+# Scores live in memory; changes are journaled and saved in the background.
+# Opened on first use, so only the process serving requests holds it (not
+# the reloader's parent or a preloading gunicorn master); run one worker.
+store = None
+store_lock = threading.Lock()
+
+def get_store():
+    global store
+    with store_lock:
+        if store is None:
+            store = ScoreStore(SCORES_FILE, {"ali": 0, "hamza": 0, "yasir": 0})
+        return store
 
 # REST API to get scores
 @app.route('/api/scores', methods=['GET'])
 def get_scores():
-    return jsonify(load_scores())
+    return jsonify(get_store().snapshot())
 
 # REST API to update a score
 @app.route('/api/update', methods=['POST'])
@@ -31,12 +34,20 @@ def update_score_api():
     data = request.json
     person = data.get('person')
     change = data.get('change')
-    scores = load_scores()
-    if person in scores:
-        scores[person] += change
-        save_scores(scores)
+    scores = get_store().update(person, change)
+    if scores is None:
+        return jsonify(get_store().snapshot())
+    broadcaster.publish({person: scores[person]})
     return jsonify(scores)
 
+# Server-Sent Events stream of score changes
+@app.route('/api/stream', methods=['GET'])
+def stream_scores():
+    since = broadcaster.seq
+    response = Response(broadcaster.stream(get_store().snapshot(), since), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 # Web route to serve the frontend
 @app.route('/')
 def home():
@@ -288,8 +299,8 @@ HTML_TEMPLATE = """<!DOCTYPE html>
         }
 
         // Update score displays
-        function updateScoreDisplays() {
-            for (const person in scores) {
+        function updateScoreDisplays(changed = scores) {
+            for (const person in changed) {
                 const el = document.getElementById(`${person}-score`);
                 if (el) {
                     el.textContent = scores[person];
@@ -353,11 +364,47 @@ HTML_TEMPLATE = """<!DOCTYPE html>
             }
         });
 
-        // Auto-refresh scores every 5 seconds to keep in sync
-        setInterval(loadScores, 5000);
+        // Live updates: Server-Sent Events, with polling only while the stream is down
+        let pollTimer = null;
+
+        function startPolling() {
+            if (!pollTimer) pollTimer = setInterval(loadScores, 5000);
+        }
+
+        function stopPolling() {
+            clearInterval(pollTimer);
+            pollTimer = null;
+        }
+
+        function connectStream() {
+            if (!window.EventSource) {
+                startPolling();
+                return;
+            }
+            const source = new EventSource('/api/stream');
+            source.addEventListener('snapshot', (event) => {
+                scores = JSON.parse(event.data);
+                updateScoreDisplays();
+            });
+            source.addEventListener('score', (event) => {
+                const changed = JSON.parse(event.data);
+                Object.assign(scores, changed);
+                updateScoreDisplays(changed);
+            });
+            source.addEventListener('resync', loadScores);
+            source.onopen = () => {
+                stopPolling();
+                setStatus('online', '● Online');
+            };
+            // EventSource keeps reconnecting on its own; poll in the meantime
+            source.onerror = startPolling;
+        }
 
         // Load scores when page loads
-        window.addEventListener('load', loadScores);
+        window.addEventListener('load', () => {
+            loadScores();
+            connectStream();
+        });
     </script>
 </body>
 </html>"""
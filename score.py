@@ -1,77 +1,66 @@
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 import json
 import os
 from urllib.parse import urlparse
+import signal
 import threading
 import time
+from score_store import ScoreStore
 
 class RespectScoreHandler(BaseHTTPRequestHandler):
     # JSON file to store scores
     SCORES_FILE = 'scores.json'
-    scores_lock = threading.Lock()
+    DEFAULT_SCORES = {'ali': 0, 'hamza': 0, 'yasir': 0}
+    # In-memory scores, journaled and saved by ScoreStore; created on first use
+    store = None
+    store_lock = threading.Lock()
+    # Cached index.html bytes
+    page = None
     
     @classmethod
-    def load_scores(cls):
-        """Load scores from JSON file"""
-        try:
-            if os.path.exists(cls.SCORES_FILE):
-                with open(cls.SCORES_FILE, 'r', encoding='utf-8') as f:
-                    scores = json.load(f)
-                    # Ensure all required people are in the scores
-                    default_scores = {'ali': 0, 'hamza': 0, 'yasir': 0}
-                    for person in default_scores:
-                        if person not in scores:
-                            scores[person] = default_scores[person]
-                    return scores
-            else:
-                # Create default scores file if it doesn't exist
-                default_scores = {'ali': 0, 'hamza': 0, 'yasir': 0}
-                cls.save_scores(default_scores)
-                return default_scores
-        except (json.JSONDecodeError, IOError) as e:
-            print(f"Error loading scores: {e}")
-            # Return default scores if file is corrupted
-            default_scores = {'ali': 0, 'hamza': 0, 'yasir': 0}
-            cls.save_scores(default_scores)
-            return default_scores
-    
+    def get_store(cls):
+        """Return the score store, loading scores.json on first use"""
+        with cls.store_lock:
+            if cls.store is None:
+                cls.store = ScoreStore(cls.SCORES_FILE, cls.DEFAULT_SCORES)
+            return cls.store
+
     @classmethod
-    def save_scores(cls, scores):
-        """Save scores to JSON file"""
-        try:
-            with open(cls.SCORES_FILE, 'w', encoding='utf-8') as f:
-                json.dump(scores, f, indent=2, ensure_ascii=False)
-            print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Scores saved to {cls.SCORES_FILE}")
-        except IOError as e:
-            print(f"Error saving scores: {e}")
+    def get_page(cls):
+        """Return index.html as bytes, reading it on first use"""
+        if cls.page is None:
+            with open('index.html', 'rb') as f:
+                cls.page = f.read()
+        return cls.page
     
     def do_GET(self):
         parsed_path = urlparse(self.path)
         
         if parsed_path.path == '/':
             # Serve the main HTML page
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html; charset=utf-8')
-            self.end_headers()
-            
             try:
-                with open('index.html', 'r', encoding='utf-8') as f:
-                    self.wfile.write(f.read().encode('utf-8'))
+                page = self.get_page()
             except FileNotFoundError:
                 self.send_response(404)
                 self.end_headers()
                 self.wfile.write(b'index.html not found')
+                return
+
+            self.send_response(200)
+            self.send_header('Content-type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(page)))
+            self.end_headers()
+            self.wfile.write(page)
                 
         elif parsed_path.path == '/api/scores':
             # Return current scores as JSON
+            body = json.dumps(self.get_store().snapshot(), ensure_ascii=False).encode('utf-8')
+
             self.send_response(200)
             self.send_header('Content-type', 'application/json; charset=utf-8')
             self.send_header('Access-Control-Allow-Origin', '*')
             self.end_headers()
-            
-            with self.scores_lock:
-                scores = self.load_scores()
-                self.wfile.write(json.dumps(scores, ensure_ascii=False).encode('utf-8'))
+            self.wfile.write(body)
                 
         else:
             # 404 for other paths
@@ -91,27 +80,22 @@ class RespectScoreHandler(BaseHTTPRequestHandler):
                 person = data.get('person')
                 change = data.get('change')
                 
-                with self.scores_lock:
-                    scores = self.load_scores()
-                    
-                    if person in scores and isinstance(change, int):
-                        old_score = scores[person]
-                        scores[person] += change
-                        self.save_scores(scores)
-                        
-                        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {person.title()}: {old_score} → {scores[person]} ({change:+d})")
-                        
-                        self.send_response(200)
-                        self.send_header('Content-type', 'application/json; charset=utf-8')
-                        self.send_header('Access-Control-Allow-Origin', '*')
-                        self.end_headers()
-                        
-                        self.wfile.write(json.dumps(scores, ensure_ascii=False).encode('utf-8'))
-                    else:
-                        self.send_response(400)
-                        self.send_header('Content-type', 'text/plain')
-                        self.end_headers()
-                        self.wfile.write(b'Invalid request: person not found or invalid change value')
+                scores = self.get_store().update(person, change)
+
+                if scores is not None:
+                    body = json.dumps(scores, ensure_ascii=False).encode('utf-8')
+                    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {person.title()}: {scores[person] - change} → {scores[person]} ({change:+d})")
+
+                    self.send_response(200)
+                    self.send_header('Content-type', 'application/json; charset=utf-8')
+                    self.send_header('Access-Control-Allow-Origin', '*')
+                    self.end_headers()
+                    self.wfile.write(body)
+                else:
+                    self.send_response(400)
+                    self.send_header('Content-type', 'text/plain')
+                    self.end_headers()
+                    self.wfile.write(b'Invalid request: person not found or invalid change value')
                         
             except (json.JSONDecodeError, ValueError) as e:
                 self.send_response(400)
@@ -148,11 +132,12 @@ def get_local_ip():
 
 def run_server(port=8000):
     server_address = ('', port)
-    httpd = HTTPServer(server_address, RespectScoreHandler)
+    # One thread per connection, so a slow client can't stall the others
+    httpd = ThreadingHTTPServer(server_address, RespectScoreHandler)
     
     # Initialize scores file
     print("📁 Initializing scores database...")
-    initial_scores = RespectScoreHandler.load_scores()
+    initial_scores = RespectScoreHandler.get_store().snapshot()
     print(f"📊 Current scores: {initial_scores}")
     
     local_ip = get_local_ip()
@@ -172,10 +157,14 @@ def run_server(port=8000):
     print("⏹️  Press Ctrl+C to stop the server")
     print("-"*60)
     
+    # Treat SIGTERM like Ctrl+C so unsaved changes are flushed on shutdown
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
     try:
         httpd.serve_forever()
     except KeyboardInterrupt:
         print("\n🛑 Server stopped by user")
+        RespectScoreHandler.get_store().close()
         print("💾 All data has been saved to scores.json")
         httpd.server_close()
 
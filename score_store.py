@@ -0,0 +1,167 @@
+import atexit
+import fcntl
+import json
+import os
+import threading
+import time
+
+
+class ScoreStore:
+    """Scores kept in memory and persisted crash-safely to a JSON file.
+
+    Every change is appended to `<path>.journal` right away as the person's
+    new absolute score, so replaying an entry twice is harmless. The full
+    file is rewritten at most once per `delay` seconds, through a temp file,
+    fsync and atomic rename, after which the journal is truncated. On load,
+    the journal is replayed over the last good snapshot. With `sync=True`
+    each journal append is also fsynced, which survives power loss rather
+    than just a process crash.
+
+    Only one process may have a store open on `path` at a time; two would
+    overwrite each other's changes. A second one gets a RuntimeError.
+    """
+
+    def __init__(self, path, defaults, delay=0.5, sync=False):
+        self.path = path
+        self.journal_path = f"{path}.journal"
+        self.delay = delay
+        self.sync = sync
+        self._lock_file = self._acquire(f"{path}.lock")
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._timer = None
+        self._dirty = False
+        self._scores = self._load(defaults)
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        atexit.register(self.close)
+
+    @staticmethod
+    def _acquire(lock_path):
+        # The journal itself is swapped out on every flush, so lock a file
+        # that stays put. The lock goes away with the process.
+        lock_file = open(lock_path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            raise RuntimeError(f"{lock_path} is held by another process; "
+                               "only one process can write these scores") from None
+        return lock_file
+
+    def _load(self, defaults):
+        scores = dict(defaults)
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                scores.update(json.load(f))
+        except FileNotFoundError:
+            pass
+        except (ValueError, OSError) as e:
+            # Keep the damaged file for inspection instead of overwriting it
+            backup = f"{self.path}.corrupt-{int(time.time())}"
+            os.replace(self.path, backup)
+            log(f"Error loading {self.path}: {e}; moved it to {backup}")
+
+        # `.next` holds entries made while a snapshot was being written
+        replayed = 0
+        for journal in (self.journal_path, f"{self.journal_path}.next"):
+            try:
+                with open(journal, encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            break  # torn final write
+                        scores[entry["person"]] = entry["score"]
+                        replayed += 1
+            except FileNotFoundError:
+                pass
+        if replayed:
+            log(f"Recovered {replayed} journaled changes for {self.path}")
+            self._write_snapshot(scores)
+            open(self.journal_path, "w").close()
+            if os.path.exists(f"{self.journal_path}.next"):
+                os.remove(f"{self.journal_path}.next")
+        elif not os.path.exists(self.path):
+            self._write_snapshot(scores)
+        return scores
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._scores)
+
+    def update(self, person, change):
+        """Add `change` to `person`'s score; return all scores, or None if invalid."""
+        if not isinstance(change, int) or isinstance(change, bool):
+            return None
+        with self._lock:
+            if person not in self._scores:
+                return None
+            self._scores[person] += change
+            self._dirty = True
+            self._journal.write(json.dumps({"person": person, "score": self._scores[person]}) + "\n")
+            self._journal.flush()
+            if self.sync:
+                os.fsync(self._journal.fileno())
+            if self._timer is None:
+                self._timer = threading.Timer(self.delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+            return dict(self._scores)
+
+    def flush(self):
+        """Write the snapshot now, if anything changed, and truncate the journal."""
+        with self._save_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                # A process that never changed anything (e.g. the Flask
+                # reloader's parent) must not overwrite newer data on exit
+                if not self._dirty:
+                    return
+                self._dirty = False
+                scores = dict(self._scores)
+                # Entries written after this point belong to the next snapshot
+                journal = self._journal
+                self._journal = open(f"{self.journal_path}.next", "a", encoding="utf-8")
+            journal.close()
+            self._write_snapshot(scores)
+            with self._lock:
+                # Anything journaled during the write moves into the fresh journal
+                self._journal.close()
+                os.replace(f"{self.journal_path}.next", self.journal_path)
+                self._journal = open(self.journal_path, "a", encoding="utf-8")
+
+    def close(self):
+        if not self._journal.closed:
+            self.flush()
+            self._journal.close()
+            self._lock_file.close()
+
+    def _write_snapshot(self, scores):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(scores, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        _fsync_dir(os.path.dirname(os.path.abspath(self.path)))
+        log(f"Scores saved to {self.path}")
+
+
+def _fsync_dir(path):
+    # Make the rename itself durable; not supported on every platform
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def log(message):
+    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {message}")
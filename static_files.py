@@ -0,0 +1,84 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+
+from flask import Response, current_app, request
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip is always available
+    brotli = None
+
+COMPRESSIBLE = ("text/", "application/json", "application/javascript", "image/svg+xml")
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+class Encoded:
+    """A response body precompressed once with every supported encoding.
+
+    Brotli's slowest setting suits files compressed once per deploy; bodies
+    rebuilt at runtime should pass a lower `brotli_quality`.
+    """
+
+    def __init__(self, data, mimetype, brotli_quality=11):
+        self.mimetype = mimetype
+        self.etag = hashlib.sha1(data).hexdigest()
+        self.bodies = {"identity": data}
+        if mimetype.startswith(COMPRESSIBLE):
+            candidates = {"gzip": gzip.compress(data, 9, mtime=0)}
+            if brotli is not None:
+                candidates["br"] = brotli.compress(data, quality=brotli_quality)
+            for encoding, body in candidates.items():
+                if len(body) < len(data):
+                    self.bodies[encoding] = body
+
+    def response(self, cache_control):
+        """Pick the best encoding the client accepts and answer conditionally."""
+        accept = request.accept_encodings
+        encoding = next((e for e in ("br", "gzip") if e in self.bodies and accept[e] > 0),
+                        "identity")
+        response = Response(self.bodies[encoding], mimetype=self.mimetype)
+        if encoding != "identity":
+            response.headers["Content-Encoding"] = encoding
+        response.vary.add("Accept-Encoding")
+        response.set_etag(f"{self.etag}-{encoding}")
+        response.headers["Cache-Control"] = cache_control
+        return response.make_conditional(request)
+
+
+class StaticAssets:
+    """Fingerprinted, precompressed copies of everything in the static folder.
+
+    `url(path)` returns `<url_path>/<stem>.<hash><ext>`, which `serve` answers
+    from memory with a year-long immutable Cache-Control. Files under
+    `hashed_dirs` already carry a content hash in their name and keep it.
+    Unknown names fall through to Flask's regular static handling.
+    """
+
+    def __init__(self, folder, url_path, hashed_dirs=()):
+        self.url_path = url_path
+        self.files = {}
+        self.urls = {}
+        for root, _, filenames in os.walk(folder):
+            for filename in filenames:
+                path = os.path.relpath(os.path.join(root, filename), folder).replace(os.sep, "/")
+                with open(os.path.join(root, filename), "rb") as f:
+                    data = f.read()
+                if path.startswith(tuple(f"{d}/" for d in hashed_dirs)):
+                    fingerprinted = path
+                else:
+                    stem, ext = os.path.splitext(path)
+                    fingerprinted = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+                mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+                self.files[fingerprinted] = Encoded(data, mimetype)
+                self.urls[path] = f"{url_path}/{fingerprinted}"
+
+    def url(self, path):
+        return self.urls.get(path, f"{self.url_path}/{path}")
+
+    def serve(self, filename):
+        asset = self.files.get(filename)
+        if asset is None:
+            return current_app.send_static_file(filename)
+        return asset.response(IMMUTABLE)
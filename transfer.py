@@ -0,0 +1,73 @@
+import csv
+import json
+from itertools import islice
+
+FORMATS = ("jsonl", "csv", "json")
+EXTENSIONS = {".jsonl": "jsonl", ".ndjson": "jsonl", ".csv": "csv", ".json": "json"}
+
+
+def guess_format(path):
+    """Pick a format from `path`'s extension; stdin/stdout default to JSON lines."""
+    for extension, fmt in EXTENSIONS.items():
+        if path.lower().endswith(extension):
+            return fmt
+    return "jsonl"
+
+
+def _row(name, score, where):
+    if not isinstance(name, str) or not name or len(name) > 50:
+        raise ValueError(f"{where}: name must be 1-50 characters")
+    try:
+        return name, int(score)
+    except (TypeError, ValueError):
+        raise ValueError(f"{where}: score must be an integer") from None
+
+
+def read_rows(f, fmt):
+    """Yield `(name, score)` pairs from an open text file, one line at a time.
+
+    `jsonl` is one `{"name": ..., "score": ...}` object per line, `csv` has
+    a `name,score` header and `json` is a `{name: score}` object like
+    scores.json, which is loaded whole.
+    """
+    if fmt == "jsonl":
+        for number, line in enumerate(f, 1):
+            if line.strip():
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    raise ValueError(f"line {number}: invalid JSON") from None
+                if not isinstance(item, dict):
+                    raise ValueError(f"line {number}: expected an object")
+                yield _row(item.get("name"), item.get("score"), f"line {number}")
+    elif fmt == "csv":
+        reader = csv.DictReader(f)
+        for item in reader:
+            yield _row(item.get("name"), item.get("score"), f"line {reader.line_num}")
+    else:
+        for name, score in json.load(f).items():
+            yield _row(name, score, repr(name))
+
+
+def write_rows(f, fmt, rows):
+    """Write `(name, score)` pairs to an open text file as they arrive."""
+    if fmt == "jsonl":
+        for name, score in rows:
+            f.write(json.dumps({"name": name, "score": score}) + "\n")
+    elif fmt == "csv":
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(("name", "score"))
+        writer.writerows(rows)
+    else:
+        # Same layout as the file ScoreStore writes
+        f.write("{")
+        for i, (name, score) in enumerate(rows):
+            f.write(("," if i else "") + f"\n  {json.dumps(name)}: {score}")
+        f.write("\n}\n")
+
+
+def batched(iterable, size):
+    """Yield lists of up to `size` items from `iterable`."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
@@ -0,0 +1,85 @@
+import atexit
+import logging
+import threading
+
+from background import ProcessThread
+
+log = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """Accumulate score deltas per key in memory and flush them in batches.
+
+    Keys are whatever the caller uses, e.g. `(board, name)`. `flush` is
+    called with a `{key: delta}` dict from a background thread
+    every `interval` seconds, or sooner once `max_events` changes have been
+    buffered. `flush_lock` is held while a batch is being written so readers
+    can take a consistent view of "committed + pending".
+    """
+
+    def __init__(self, flush, interval=0.1, max_events=500):
+        self.interval = interval
+        self.max_events = max_events
+        self.flush_lock = threading.Lock()
+        self._flush = flush
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._events = 0
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = ProcessThread(self._run, "write-behind")
+
+    def start(self):
+        """Start this process's flusher thread; safe to call on every request.
+
+        Called lazily so no thread runs in a preloading gunicorn master, where
+        forking while it held one of the locks would leave that lock held in
+        the worker for good.
+        """
+        if self._thread.start():
+            # Drain whatever is still buffered when the worker shuts down
+            atexit.register(self.stop)
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+
+    def add(self, changes):
+        with self._lock:
+            for key, change in changes.items():
+                self._pending[key] = self._pending.get(key, 0) + change
+            self._events += 1
+            full = self._events >= self.max_events
+        if full:
+            self._wake.set()
+
+    def pending(self):
+        """Return a copy of the deltas not yet written to the database."""
+        with self._lock:
+            return dict(self._pending)
+
+    def flush(self):
+        with self.flush_lock:
+            with self._lock:
+                batch, self._pending, self._events = self._pending, {}, 0
+            if not batch:
+                return
+            try:
+                self._flush(batch)
+            except Exception:
+                # Put the batch back so the next flush retries it
+                with self._lock:
+                    for key, change in batch.items():
+                        self._pending[key] = self._pending.get(key, 0) + change
+                raise
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                log.exception("Write-behind flush failed; will retry")